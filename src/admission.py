@@ -0,0 +1,174 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import Counter, QUEUE_DEPTH
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Interactive requests (map clicks, uploads from the UI) are served before
+# bulk callers, which mark themselves with an "X-Priority: bulk" header
+INTERACTIVE = 0
+BULK = 1
+
+REJECTIONS = Counter(
+    "wildfire_admission_rejections_total",
+    "Requests rejected by admission control, by route and reason.",
+    ["route", "reason"],
+)
+
+
+# Raised when a request is shed; carries the HTTP status and Retry-After
+class Overloaded(Exception):
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.message = message
+
+
+# Token bucket refilled at `rate` tokens per second up to `burst`
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    # Returns 0 when a token was taken, otherwise the seconds until one is free
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+
+# Per-client token buckets, keeping only the most recently seen clients
+class ClientRateLimiter:
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, route, client):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            bucket = self.buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+            self.buckets[client] = bucket
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+            wait = bucket.take()
+        if wait > 0:
+            REJECTIONS.inc(route=route, reason="rate_limited")
+            raise Overloaded(429, wait, "Too many requests, please slow down.")
+
+
+# Concurrency limit for one route with a bounded, prioritised wait queue.
+# A request that cannot start before its deadline is rejected immediately
+# instead of occupying a queue slot it would time out in.
+class AdmissionController:
+    def __init__(self, name, max_concurrent, max_queue, max_wait):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        # Moving average of how long an admitted request holds its slot
+        self.service_time = 0.5
+
+    def _estimated_wait(self, priority):
+        ahead = sum(1 for entry in self.waiting if entry[0] <= priority)
+        return (ahead + 1) * self.service_time / self.max_concurrent
+
+    def _shed(self, reason, retry_after, message):
+        REJECTIONS.inc(route=self.name, reason=reason)
+        raise Overloaded(503, retry_after, message)
+
+    @contextmanager
+    def admit(self, priority=INTERACTIVE, deadline=None):
+        deadline = self.max_wait if deadline is None else min(deadline, self.max_wait)
+        with self.condition:
+            if self.active >= self.max_concurrent or self.waiting:
+                self._wait_for_slot(priority, deadline)
+            self.active += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self.condition:
+                self.active -= 1
+                self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+                self.condition.notify_all()
+
+    # Called with the condition held; returns once this request may start
+    def _wait_for_slot(self, priority, deadline):
+        estimate = self._estimated_wait(priority)
+        if len(self.waiting) >= self.max_queue:
+            self._shed("queue_full", estimate, "Server is busy, please retry later.")
+        if estimate > deadline:
+            self._shed("deadline", estimate, "Server is busy, please retry later.")
+
+        entry = (priority, next(self.sequence))
+        heapq.heappush(self.waiting, entry)
+        QUEUE_DEPTH.set(len(self.waiting), queue=f"admission_{self.name}")
+        give_up = time.monotonic() + deadline
+        try:
+            while self.waiting[0] is not entry or self.active >= self.max_concurrent:
+                remaining = give_up - time.monotonic()
+                if remaining <= 0:
+                    self._shed("timeout", self._estimated_wait(priority), "Server is busy, please retry later.")
+                self.condition.wait(remaining)
+        finally:
+            self.waiting.remove(entry)
+            heapq.heapify(self.waiting)
+            QUEUE_DEPTH.set(len(self.waiting), queue=f"admission_{self.name}")
+            # The head of the queue may have changed
+            self.condition.notify_all()
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+# Controllers for the inference routes, sized from the environment, e.g.
+# ADMISSION_SATELLITE_CONCURRENCY=16. The limits sit above the model's own
+# parallelism so fetching and decoding overlap with inference.
+def _controller(name, concurrency):
+    prefix = f"ADMISSION_{name.upper()}_"
+    return AdmissionController(
+        name,
+        max_concurrent=_env_int(prefix + "CONCURRENCY", concurrency),
+        max_queue=_env_int(prefix + "QUEUE", 4 * concurrency),
+        max_wait=float(os.getenv(prefix + "MAX_WAIT", "10")),
+    )
+
+
+controllers = {
+    "camera": _controller("camera", 8),
+    "satellite": _controller("satellite", 8),
+    "camera_stream": _controller("camera_stream", 2),
+}
+
+# Off by default: clients are told apart by address, which behind a proxy is
+# only possible with TRUSTED_PROXY_HOPS set (see app.py)
+client_limiter = ClientRateLimiter(
+    rate=float(os.getenv("ADMISSION_CLIENT_RATE", "0")),
+    burst=float(os.getenv("ADMISSION_CLIENT_BURST", "20")),
+)
@@ -1,19 +1,68 @@
+import math
 import os
 from dotenv import load_dotenv
 from apscheduler.schedulers.background import BackgroundScheduler
 import subprocess
 import atexit
-
-from flask import Flask, render_template, request, jsonify
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import (
+    Flask,
+    render_template,
+    request,
+    jsonify,
+    Response,
+    abort,
+    make_response,
+    send_from_directory,
+)
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from satellite_functions import satellite_cnn_predict
-from camera_functions import camera_cnn_predict
+from imagery_client import ImageryUnavailable
+from camera_functions import camera_cnn_predict, camera_stream_predict
+import meteorological_functions
 from meteorological_functions import weather_data_predict
+from metrics import (
+    ALERT_METRICS_PATH,
+    WORKER_METRICS_DIR,
+    load_snapshot,
+    load_snapshots,
+    render_metrics,
+    start_snapshot_writer,
+)
+from model_loading import load_models
+from risk_history import RESOLUTIONS, query as query_risk_history, risk_history
+from file_lock import FileLock
+import admission
+from admission import BULK, INTERACTIVE, Overloaded, client_limiter, controllers
+from profiling import (
+    PROFILE_DIR,
+    check_token,
+    list_profiles,
+    profile_requested,
+    profile_unit,
+)
 
 import sqlite3
 
 load_dotenv()
 MAPBOX_TOKEN = os.getenv("MAPBOX_TOKEN")
+# Profile every run of the hourly alert job
+PROFILE_ALERT_JOB = os.getenv("PROFILE_ALERT_JOB", "false").lower() == "true"
+# Only the process holding this lock schedules the alert job; the others
+# retry every SCHEDULER_RETRY_SECONDS in case the holder exits
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", "scheduler.lock")
+SCHEDULER_RETRY_SECONDS = float(os.getenv("SCHEDULER_RETRY_SECONDS", "60"))
+# The alert job runs every hour at this minute past the hour. Runs follow
+# the wall clock, so whichever process takes over the job keeps the same
+# schedule, however often the process holding it is recycled.
+ALERT_MINUTE = int(os.getenv("ALERT_MINUTE", "0"))
+# Number of reverse proxies (e.g. a load balancer) in front of the app whose
+# X-Forwarded-For entries are trusted for the client address
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
 
 # Create a database and alerts table if not exists
 
@@ -37,23 +86,123 @@ def init_db():
 # Function that runs email_alert.py script
 def run_alert_script():
     script_path = os.path.join(os.path.dirname(__file__), "email_alert.py")
+    command = ["python", script_path]
+    if PROFILE_ALERT_JOB:
+        command.append("--profile")
     try:
-        subprocess.run(["python", script_path], check=True)
+        subprocess.run(command, check=True)
         print("Processing script executed successfully.")
     except subprocess.CalledProcessError as e:
         print(f"Error running processing script: {e}")
 
 
-# Initialize the scheduler
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=run_alert_script, trigger="interval", hours=1)
-scheduler.start()
+scheduler_lock = FileLock(SCHEDULER_LOCK_PATH)
+
+
+# Function to start the hourly alert job in exactly one process, so
+# multiple web workers never send the same alert twice
+def start_alert_scheduler():
+    if not scheduler_lock.try_acquire():
+        retry = threading.Timer(SCHEDULER_RETRY_SECONDS, start_alert_scheduler)
+        retry.daemon = True
+        retry.start()
+        return
+
+    scheduler.add_job(func=run_alert_script, trigger="cron", minute=ALERT_MINUTE)
+    scheduler.start()
+
+    # Ensure the scheduler is shut down properly on exit
+    atexit.register(lambda: scheduler.shutdown())
+
+
+# gunicorn hooks (see gunicorn.conf.py). The app is imported once in the
+# gunicorn master and the workers are forked from it, sharing its memory.
+
+# Called in the master before each worker is forked
+def before_fork():
+    # SQLite connections must not be carried across fork
+    meteorological_functions.cache_session.cache.close()
 
-# Ensure the scheduler is shut down properly on exit
-atexit.register(lambda: scheduler.shutdown())
+
+# Called in each worker after it is forked, before it serves requests
+def after_fork():
+    load_models()
+    if WORKER_METRICS_DIR:
+        os.makedirs(WORKER_METRICS_DIR, exist_ok=True)
+        start_snapshot_writer(os.path.join(WORKER_METRICS_DIR, f"web-{os.getpid()}.json"))
+    start_alert_scheduler()
 
 
 app = Flask(__name__)
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+
+
+# Decorator profiling a route when asked via the X-Profile header (set to
+# ADMIN_TOKEN) or picked by PROFILE_SAMPLE_RATE
+def profiled(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        enabled = profile_requested(request.headers.get("X-Profile"))
+        with profile_unit(view.__name__, enabled=enabled) as profile_id:
+            response = make_response(view(*args, **kwargs))
+        if profile_id:
+            response.headers["X-Profile-Id"] = profile_id
+
+        return response
+
+    return wrapper
+
+
+# Decorator applying per-client rate limits and the route's concurrency
+# limit; shed requests get 429/503 with a Retry-After header
+def admitted(route):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not admission.ADMISSION_ENABLED:
+                return view(*args, **kwargs)
+
+            priority = BULK if request.headers.get("X-Priority") == "bulk" else INTERACTIVE
+            deadline = request.headers.get("X-Request-Deadline-Ms", type=float)
+            if deadline is not None and not (math.isfinite(deadline) and deadline > 0):
+                return (
+                    jsonify(
+                        {
+                            "success": False,
+                            "message": "X-Request-Deadline-Ms must be a positive number.",
+                        }
+                    ),
+                    400,
+                )
+            try:
+                client_limiter.check(route, request.remote_addr)
+                with controllers[route].admit(
+                    priority, deadline=None if deadline is None else deadline / 1000
+                ):
+                    return view(*args, **kwargs)
+            except Overloaded as e:
+                response = jsonify({"success": False, "message": e.message})
+                response.status_code = e.status
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
+
+        return wrapper
+
+    return decorator
+
+
+# Decorator restricting admin routes to requests carrying ADMIN_TOKEN
+def admin_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not check_token(request.headers.get("X-Admin-Token")):
+            abort(403)
+
+        return view(*args, **kwargs)
+
+    return wrapper
 
 
 @app.route("/")
@@ -144,6 +293,8 @@ def alert():
 
 # The route for predicting wildfire using satellite data
 @app.route("/satellite_predict", methods=["POST"])
+@admitted("satellite")
+@profiled
 def satellite_predict():
     data = request.json
     latitude = data["location"][1]
@@ -154,25 +305,34 @@ def satellite_predict():
     crop_amount = 35
     save_path = "satellite_image.png"
 
-    prediction_sattelite = satellite_cnn_predict(
-        latitude,
-        longitude,
-        output_size=output_size,
-        zoom_level=zoom,
-        crop_amount=crop_amount,
-        save_path=save_path,
-    )
-
-    satellite_confidence = round(
-        (
-            prediction_sattelite
-            if prediction_sattelite > 0.5
-            else 1 - prediction_sattelite
+    # Without imagery the prediction degrades to the weather model alone
+    imagery_message = None
+    try:
+        prediction_sattelite = satellite_cnn_predict(
+            latitude,
+            longitude,
+            output_size=output_size,
+            zoom_level=zoom,
+            crop_amount=crop_amount,
+            save_path=save_path,
         )
-        * 100
-    )  # float to percentage
+    except ImageryUnavailable as e:
+        prediction_sattelite = None
+        imagery_message = str(e)
+
+    satellite_confidence = None
+    satellite_status = None
+    if prediction_sattelite is not None:
+        satellite_confidence = round(
+            (
+                prediction_sattelite
+                if prediction_sattelite > 0.5
+                else 1 - prediction_sattelite
+            )
+            * 100
+        )  # float to percentage
 
-    satellite_status = 1 if prediction_sattelite > 0.5 else 0
+        satellite_status = 1 if prediction_sattelite > 0.5 else 0
 
     prediction_weather = weather_data_predict(latitude, longitude)
 
@@ -184,7 +344,10 @@ def satellite_predict():
     weather_status = 1 if prediction_weather > 0.5 else 0
 
     # Calculate average probability and its corresponding binary status
-    prediction_average = (prediction_sattelite + prediction_weather) / 2
+    if prediction_sattelite is None:
+        prediction_average = prediction_weather
+    else:
+        prediction_average = (prediction_sattelite + prediction_weather) / 2
 
     average_confidence = round(
         (prediction_average if prediction_average > 0.5 else 1 - prediction_average)
@@ -193,6 +356,16 @@ def satellite_predict():
 
     average_status = 1 if prediction_average > 0.5 else 0
 
+    if risk_history is not None:
+        risk_history.record(
+            latitude,
+            longitude,
+            prediction_sattelite,
+            prediction_weather,
+            prediction_average,
+            source="web",
+        )
+
     response = {
         "satellite_probability": satellite_confidence,
         "satellite_status": satellite_status,
@@ -200,13 +373,18 @@ def satellite_predict():
         "weather_status": weather_status,
         "average_probability": average_confidence,
         "average_status": average_status,
+        "satellite_available": prediction_sattelite is not None,
     }
+    if imagery_message:
+        response["message"] = f"Satellite imagery unavailable: {imagery_message}"
 
     return jsonify(response), 200
 
 
 # The route for predicting wildfire using camera images
 @app.route("/camera_predict", methods=["POST"])
+@admitted("camera")
+@profiled
 def camera_predict():
     image_file = request.files["image"]
     prediction = camera_cnn_predict(image_file)
@@ -225,8 +403,144 @@ def camera_predict():
     return jsonify(response_data), 200
 
 
+# The route for monitoring a camera from a video file or MJPEG stream
+@app.route("/camera_stream_predict", methods=["POST"])
+@admitted("camera_stream")
+@profiled
+def camera_stream_predict_route():
+    stream_file = request.files["stream"]
+    camera_id = request.form.get("camera_id", "default")
+    sample_fps = request.form.get("sample_fps", type=float)
+    if "sample_fps" in request.form and not (
+        sample_fps is not None and math.isfinite(sample_fps) and sample_fps > 0
+    ):
+        return (
+            jsonify({"success": False, "message": "sample_fps must be a positive number."}),
+            400,
+        )
+
+    try:
+        result = camera_stream_predict(
+            stream_file, stream_file.filename, camera_id, sample_fps=sample_fps
+        )
+    except RuntimeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    rolling_risk = result["rolling_risk"]
+    if rolling_risk is None:
+        return (
+            jsonify({"success": False, "message": "No frames could be read."}),
+            400,
+        )
+
+    response_data = {
+        "camera_id": camera_id,
+        "frames": result["frames"],
+        "sampled_frames": result["sampled"],
+        "duplicate_frames": result["duplicates"],
+        "scored_frames": result["scored"],
+        "rolling_risk": round(rolling_risk * 100),
+        "wildfire_prediction": 1 if rolling_risk > 0.5 else 0,
+    }
+
+    return jsonify(response_data), 200
+
+
+# Function to parse an ISO 8601 time to unix time; times without an offset
+# are taken as UTC
+def parse_time(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    return parsed.timestamp()
+
+
+# The route reading a location's stored risk scores over a time range
+# (default: the past 7 days) at raw, hourly or daily resolution
+@app.route("/risk_history")
+def risk_history_route():
+    latitude = request.args.get("latitude", type=float)
+    longitude = request.args.get("longitude", type=float)
+    resolution = request.args.get("resolution", "hourly")
+    if (
+        latitude is None
+        or longitude is None
+        or not (math.isfinite(latitude) and -90 <= latitude <= 90)
+        or not (math.isfinite(longitude) and -180 <= longitude <= 180)
+        or resolution not in RESOLUTIONS
+    ):
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "message": f"A valid latitude, longitude and a resolution of {', '.join(RESOLUTIONS)} are required.",
+                }
+            ),
+            400,
+        )
+
+    try:
+        end = parse_time(request.args["end"]) if "end" in request.args else datetime.now().timestamp()
+        start = parse_time(request.args["start"]) if "start" in request.args else end - 7 * 86400
+    except ValueError:
+        return (
+            jsonify({"success": False, "message": "start and end must be ISO 8601 times."}),
+            400,
+        )
+
+    points = query_risk_history(latitude, longitude, start, end, resolution)
+    for point in points:
+        point["time"] = datetime.fromtimestamp(point["time"], timezone.utc).isoformat()
+        for key in ("average", "average_min", "average_max", "weather", "satellite"):
+            if point[key] is not None:
+                point[key] = round(point[key] * 100)  # float to percentage
+
+    response = {
+        "success": True,
+        "latitude": latitude,
+        "longitude": longitude,
+        "resolution": resolution,
+        "points": points,
+    }
+
+    return jsonify(response), 200
+
+
+# The route exposing metrics of the web app and the alert job to Prometheus.
+# Under gunicorn each worker is reported as its own process, web-<pid>.
+@app.route("/metrics")
+def metrics():
+    process = "web"
+    other_snapshots = {"alert_job": load_snapshot(ALERT_METRICS_PATH)}
+    if WORKER_METRICS_DIR:
+        process = f"web-{os.getpid()}"
+        other_snapshots.update(load_snapshots(WORKER_METRICS_DIR, exclude=process))
+    output = render_metrics(process=process, other_snapshots=other_snapshots)
+
+    return Response(output, mimetype="text/plain; version=0.0.4")
+
+
+# The route listing captured profiles, newest first
+@app.route("/admin/profiles")
+@admin_only
+def admin_profiles():
+    return jsonify({"profiles": list_profiles()}), 200
+
+
+# The route downloading a profile, as a pstats (.prof) or summary (.txt) file
+@app.route("/admin/profiles/<path:filename>")
+@admin_only
+def admin_profile_file(filename):
+    if not filename.endswith((".prof", ".txt")):
+        abort(404)
+
+    return send_from_directory(os.path.abspath(PROFILE_DIR), filename)
+
+
 if __name__ == "__main__":
     init_db()
-    # Use production settings for containerized environments
+    start_alert_scheduler()
+    # Development server; use gunicorn -c src/gunicorn.conf.py in production
     port = int(os.environ.get("PORT", 4000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Autotune the CPU inference runtime for this host
+Benchmarks the camera and satellite CNNs for every combination of
+TensorFlow intra-op/inter-op threads and batch size, and writes the
+fastest settings to the runtime profile the app loads at startup
+(RUNTIME_PROFILE, default runtime_profile.json).
+
+TensorFlow only accepts thread settings before it starts, so every
+combination runs in fresh processes: --workers of them at once, as many
+as gunicorn runs on the host, each with --callers threads calling the
+model concurrently like request threads do.
+
+Usage:
+    python src/autotune_runtime.py
+    python src/autotune_runtime.py --workers 4 --callers 4 --duration 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from runtime_config import RUNTIME_PROFILE
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+
+MODEL_PATHS = {
+    "camera": "analysis/wildfire_detection_model.keras",
+    "satellite": "analysis/wildfire_satellite_detection_model.keras",
+}
+
+
+# Function to list the thread settings worth trying with `cores` per worker
+def candidate_threads(cores):
+    intra = sorted({1, cores} | {n for n in (2, 4, 8, 16, 32) if n < cores})
+    inter = [1, 2]
+    return [(i, j) for i in intra for j in inter]
+
+
+# Run one combination in this process and print its results as JSON
+def run_trial(intra, inter, model_paths, batch_sizes, callers, duration):
+    import tensorflow as tf
+    from threadpoolctl import threadpool_limits
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra)
+    tf.config.threading.set_inter_op_parallelism_threads(inter)
+    threadpool_limits(limits=intra)
+
+    results = {}
+    for name, path in model_paths.items():
+        model = tf.keras.models.load_model(path)
+        results[name] = {}
+        for batch_size in batch_sizes:
+            x = np.random.default_rng(0).random((batch_size, 224, 224, 3), dtype=np.float32)
+            for _ in range(2):
+                model.predict(x, batch_size=batch_size, verbose=0)
+
+            latencies = [[] for _ in range(callers)]
+            stop_at = time.perf_counter() + duration
+
+            def call(index):
+                while time.perf_counter() < stop_at:
+                    t0 = time.perf_counter()
+                    model.predict(x, batch_size=batch_size, verbose=0)
+                    latencies[index].append(time.perf_counter() - t0)
+
+            start = time.perf_counter()
+            threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            calls = np.concatenate([np.array(values) for values in latencies])
+            results[name][str(batch_size)] = {
+                "images_per_s": len(calls) * batch_size / elapsed,
+                "p95_ms": float(np.percentile(calls, 95) * 1000),
+            }
+
+    print(json.dumps(results))
+
+
+# Function to run a combination in `workers` processes at once and add up
+# their throughput
+def run_combination(intra, inter, args):
+    command = [
+        sys.executable, __file__, "--run-trial", str(intra), str(inter),
+        "--camera-model", args.camera_model, "--satellite-model", args.satellite_model,
+        "--batch-sizes", *map(str, args.batch_sizes),
+        "--callers", str(args.callers), "--duration", str(args.duration),
+    ]
+    processes = [
+        subprocess.Popen(command, cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        for _ in range(args.workers)
+    ]
+    outputs = [process.communicate() for process in processes]
+    for process, (stdout, stderr) in zip(processes, outputs):
+        if process.returncode != 0:
+            print(stderr)
+            raise SystemExit(f"Autotune trial intra={intra} inter={inter} failed.")
+
+    trials = [json.loads(stdout.strip().splitlines()[-1]) for stdout, _ in outputs]
+    combined = {}
+    for name in trials[0]:
+        combined[name] = {}
+        for batch_size in trials[0][name]:
+            runs = [trial[name][batch_size] for trial in trials]
+            combined[name][batch_size] = {
+                "images_per_s": sum(run["images_per_s"] for run in runs),
+                "p95_ms": max(run["p95_ms"] for run in runs),
+            }
+
+    return combined
+
+
+# Function to pick the batch size with the highest throughput whose p95
+# latency stays within the budget, falling back to the smallest batch
+def best_batch(results, max_batch_ms):
+    within = {b: r for b, r in results.items() if r["p95_ms"] <= max_batch_ms}
+    if not within:
+        smallest = min(results, key=int)
+        return int(smallest), results[smallest]["images_per_s"]
+
+    batch_size = max(within, key=lambda b: within[b]["images_per_s"])
+    return int(batch_size), within[batch_size]["images_per_s"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        help="Gunicorn workers on the host, defaults to WEB_CONCURRENCY or one per CPU like gunicorn.conf.py",
+    )
+    parser.add_argument("--callers", type=int, default=4, help="Concurrent model calls per worker")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16, 32, 64])
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    parser.add_argument("--max-batch-ms", type=float, default=1000.0, help="p95 budget per model call")
+    parser.add_argument("--camera-model", default=MODEL_PATHS["camera"])
+    parser.add_argument("--satellite-model", default=MODEL_PATHS["satellite"])
+    parser.add_argument("--output", default=RUNTIME_PROFILE)
+    parser.add_argument("--run-trial", nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    model_paths = {"camera": args.camera_model, "satellite": args.satellite_model}
+    if args.run_trial:
+        run_trial(*args.run_trial, model_paths, args.batch_sizes, args.callers, args.duration)
+        return
+
+    cores = max(1, (os.cpu_count() or 1) // args.workers)
+    best = None
+    results = []
+    for intra, inter in candidate_threads(cores):
+        combined = run_combination(intra, inter, args)
+        choices = {name: best_batch(combined[name], args.max_batch_ms) for name in model_paths}
+        # Geometric mean, so neither model's throughput dominates the choice
+        score = float(np.exp(np.mean([np.log(throughput) for _, throughput in choices.values()])))
+        results.append({"intra_op_threads": intra, "inter_op_threads": inter, "models": combined})
+        print(
+            f"intra {intra:2} inter {inter} | "
+            + " | ".join(f"{name} {t:7.1f} img/s @ batch {b:3}" for name, (b, t) in choices.items())
+        )
+        if best is None or score > best[0]:
+            best = (score, intra, inter, choices)
+
+    _, intra, inter, choices = best
+    profile = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "host": {"platform": platform.platform(), "cpu_count": os.cpu_count(), "workers": args.workers},
+        "intra_op_threads": intra,
+        "inter_op_threads": inter,
+        "blas_threads": intra,
+        "batch_caps": {name: batch_size for name, (batch_size, _) in choices.items()},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(
+        f"Best: intra {intra}, inter {inter}, batch caps {profile['batch_caps']}; "
+        f"profile written to '{args.output}'"
+    )
+
+
+if __name__ == "__main__":
+    main()
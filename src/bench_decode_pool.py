@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the camera decode pool
+Decodes a set of JPEG uploads from several request threads, first inline
+and then through decode pools of increasing size, and reports images/s
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from decode_pool import DecodePool
+from image_preprocessing import preprocess_image
+
+
+def make_jpeg(width, height, seed):
+    rng = np.random.default_rng(seed)
+    # Smooth gradients plus noise, closer to a photo than pure noise
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, size=(height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def decode_inline(data):
+    image = Image.open(BytesIO(data)).convert("RGB")
+    return preprocess_image(image)
+
+
+def run(decode, blobs, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(decode, blobs))
+    return len(blobs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    blobs = [make_jpeg(args.width, args.height, seed) for seed in range(8)]
+    blobs = (blobs * (args.images // len(blobs) + 1))[: args.images]
+
+    sizes = [1]
+    while sizes[-1] * 2 <= args.max_workers:
+        sizes.append(sizes[-1] * 2)
+    if sizes[-1] != args.max_workers:
+        sizes.append(args.max_workers)
+
+    print(f"{args.images} images of {args.width}x{args.height} on {os.cpu_count()} cores")
+    print(f"{'mode':12} | {'images/s':>9} | {'speedup':>7}")
+    print("-" * 35)
+
+    inline = run(decode_inline, blobs, args.max_workers)
+    print(f"{'inline':12} | {inline:9.1f} | {1.0:7.2f}")
+
+    for workers in sizes:
+        pool = DecodePool(workers)
+        try:
+            pool.decode(blobs[0])  # warm up
+            throughput = run(pool.decode, blobs, workers * 2)
+        finally:
+            pool.close()
+        print(f"{'pool x' + str(workers):12} | {throughput:9.1f} | {throughput / inline:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for image preprocessing
+Compares the legacy float64 pipeline with the shared float32 buffers
+in terms of time per image and bytes allocated per inference
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import preprocess_image, preprocess_batch
+
+
+def legacy_preprocess_image(img):
+    img_resized = img.resize((224, 224))
+    img_array = np.array(img_resized)
+    img_array = img_array / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def legacy_preprocess_batch(images):
+    return np.concatenate([legacy_preprocess_image(img) for img in images])
+
+
+def measure(func, arg, repeats):
+    """Return (seconds per call, peak bytes allocated by one call)"""
+    func(arg)  # warm up buffers
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func(arg)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(385, 350, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    images = [image] * args.batch_size
+
+    cases = [
+        ("single legacy", legacy_preprocess_image, image, 1),
+        ("single float32", preprocess_image, image, 1),
+        ("batch legacy", legacy_preprocess_batch, images, args.batch_size),
+        ("batch float32", preprocess_batch, images, args.batch_size),
+    ]
+
+    print(f"{'case':16} | {'ms/image':>9} | {'KiB allocated/image':>20}")
+    print("-" * 52)
+    for name, func, arg, count in cases:
+        elapsed, peak = measure(func, arg, args.repeats)
+        print(f"{name:16} | {elapsed / count * 1000:9.3f} | {peak / count / 1024:20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite for every prediction path
+External services are replaced by local fixtures: a stub Mapbox server,
+a fixed Open-Meteo response and a recording MailerSend client. Each case
+runs in its own process so peak RSS is attributed to that case alone.
+
+Usage:
+    python src/benchmark_suite.py                    # run and compare to baseline
+    python src/benchmark_suite.py --save-baseline    # store results as the baseline
+    python src/benchmark_suite.py --stub-models      # without the .keras files
+"""
+
+import argparse
+import atexit
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SRC_DIR)
+DEFAULT_RESULTS = os.path.join(ROOT_DIR, "benchmark_results.json")
+DEFAULT_BASELINE = os.path.join(SRC_DIR, "benchmark_baseline.json")
+
+# Settings pointing the app's state files into the case's state directory,
+# so a run never touches the risk history, feature log, alert job metrics
+# or profiles of a deployment on the same host
+STATE_FILES = {
+    "RISK_HISTORY_DB": "risk_history.db",
+    "FEATURE_LOG_DIR": "feature_log",
+    "ALERT_METRICS_PATH": "alert_metrics.json",
+    "ALERT_JOB_LOCK_PATH": "alert_job.lock",
+    "SCHEDULER_LOCK_PATH": "scheduler.lock",
+    "PROFILE_DIR": "profiles",
+}
+state_dir = None
+
+
+# Fixtures
+
+
+def make_jpeg(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, size=(height, width, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class WeatherFixture:
+    """Mimics the parts of an Open-Meteo response the app reads"""
+
+    class _Variable:
+        def __init__(self, value):
+            self.value = value
+
+        def Value(self):
+            return self.value
+
+    class _Current:
+        def __init__(self, values):
+            self.values = values
+
+        def Variables(self, i):
+            return WeatherFixture._Variable(self.values[i])
+
+    # temperature, relative humidity, precipitation, rain, wind speed
+    def __init__(self, values=(32.0, 38.0, 0.0, 0.0, 18.0)):
+        self.values = values
+
+    def Current(self):
+        return WeatherFixture._Current(self.values)
+
+
+class StubMailer:
+    """Stands in for mailersend.emails.NewEmail"""
+
+    sent = 0
+
+    def __init__(self, api_key):
+        pass
+
+    def set_mail_from(self, mail_from, body):
+        body["from"] = mail_from
+
+    def set_mail_to(self, recipients, body):
+        body["to"] = recipients
+
+    def set_subject(self, subject, body):
+        body["subject"] = subject
+
+    def set_html_content(self, content, body):
+        body["html"] = content
+
+    def send(self, body):
+        StubMailer.sent += 1
+        return "202"
+
+
+class StubModel:
+    """Stands in for a Keras model when the .keras files are not available"""
+
+    def predict(self, x, verbose=0, batch_size=None):
+        x = np.asarray(x, dtype=np.float32)
+        return x.reshape(len(x), -1).mean(axis=1, keepdims=True)
+
+
+class StubScaler:
+    """Stands in for the fitted StandardScaler"""
+
+    def transform(self, df):
+        return np.asarray(df, dtype=np.float64)
+
+
+# Stub Mapbox server returning the same satellite image for every request
+def start_stub_mapbox():
+    image = make_jpeg(350, 385, seed=1)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def install_fixtures(stub_models):
+    """Patch external dependencies, must run before the app modules import"""
+    server = start_stub_mapbox()
+    os.environ["MAPBOX_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["MAPBOX_TOKEN"] = "stub"
+
+    global state_dir
+    state_dir = tempfile.mkdtemp(prefix="wildfire-benchmark-")
+    atexit.register(shutil.rmtree, state_dir, ignore_errors=True)
+    for setting, name in STATE_FILES.items():
+        os.environ[setting] = os.path.join(state_dir, name)
+
+    sys.path.insert(0, SRC_DIR)
+
+    if stub_models:
+        # Stubs replace the models once the case has imported its modules
+        # (see install_stub_models), so TensorFlow only counts towards the peak RSS
+        # of the cases that use it
+        import model_loading
+
+        model_loading.DEFER_MODEL_LOADING = True
+
+    import meteorological_functions
+
+    fixture = WeatherFixture()
+    meteorological_functions.fetch_weather_data = lambda latitude, longitude: fixture
+
+    return server
+
+
+# Function to give every model-serving module a case imported a stub model
+def install_stub_models():
+    for name in ("camera_functions", "satellite_functions", "meteorological_functions"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.model = StubModel()
+    sys.modules["meteorological_functions"].std_scaler = StubScaler()
+
+
+# Function to make a module's satellite predictions save their image in the
+# state directory instead of the working directory
+def redirect_satellite_image(module):
+    predict = module.satellite_cnn_predict
+
+    def satellite_cnn_predict(*args, save_path, **kwargs):
+        save_path = os.path.join(state_dir, os.path.basename(save_path))
+        return predict(*args, save_path=save_path, **kwargs)
+
+    module.satellite_cnn_predict = satellite_cnn_predict
+
+
+# Benchmark cases: each returns a zero-argument callable for one operation
+
+
+def case_camera_cnn_predict():
+    from camera_functions import camera_cnn_predict
+
+    image = make_jpeg(1280, 720)
+    return lambda: camera_cnn_predict(BytesIO(image))
+
+
+def case_satellite_cnn_predict():
+    from satellite_functions import satellite_cnn_predict
+
+    return lambda: satellite_cnn_predict(
+        37.77, -122.42, (350, 350), 15, 35, os.path.join(state_dir, "satellite_image.png")
+    )
+
+
+def case_weather_data_predict():
+    from meteorological_functions import weather_data_predict
+
+    return lambda: weather_data_predict(37.77, -122.42)
+
+
+def case_fwi():
+    from meteorological_functions import (
+        calculate_ffmc,
+        calculate_dmc,
+        calculate_dc,
+        calculate_isi,
+        calculate_bui,
+        calculate_fwi,
+    )
+
+    def run():
+        ffmc = calculate_ffmc(32.0, 38.0, 18.0, 0.0, 80.0)
+        dmc = calculate_dmc(32.0, 38.0, 0.0, 15.0, 7)
+        dc = calculate_dc(32.0, 0.0, 25.0, 7)
+        return calculate_fwi(calculate_isi(ffmc, 18.0), calculate_bui(dmc, dc))
+
+    return run
+
+
+def case_process_alerts():
+    # Imported here rather than in install_fixtures: email_alert pulls in the
+    # satellite model, which would inflate every other case's peak RSS
+    import email_alert
+
+    email_alert.emails.NewEmail = StubMailer
+    email_alert.fetch_alerts = lambda: [
+        (f"user{i}@example.com", 37.77 + i * 0.01, -122.42) for i in range(5)
+    ]
+    redirect_satellite_image(email_alert)
+
+    return email_alert.process_alerts
+
+
+def _client():
+    import app
+
+    redirect_satellite_image(app)
+    return app.app.test_client()
+
+
+def case_route_camera_predict():
+    client = _client()
+    image = make_jpeg(1280, 720)
+
+    def run():
+        response = client.post(
+            "/camera_predict", data={"image": (BytesIO(image), "frame.jpg")}
+        )
+        assert response.status_code == 200
+
+    return run
+
+
+def case_route_satellite_predict():
+    client = _client()
+
+    def run():
+        response = client.post(
+            "/satellite_predict", json={"location": [-122.42, 37.77], "zoom": 15}
+        )
+        assert response.status_code == 200
+
+    return run
+
+
+CASES = {
+    "camera_cnn_predict": (case_camera_cnn_predict, 50),
+    "satellite_cnn_predict": (case_satellite_cnn_predict, 50),
+    "weather_data_predict": (case_weather_data_predict, 200),
+    "fwi": (case_fwi, 5000),
+    "process_alerts": (case_process_alerts, 10),
+    "route_camera_predict": (case_route_camera_predict, 50),
+    "route_satellite_predict": (case_route_satellite_predict, 50),
+}
+
+
+def percentile(latencies, q):
+    return float(np.percentile(latencies, q) * 1000)
+
+
+# Run one case in this process and print its results as JSON
+def run_case(name, iterations, stub_models):
+    install_fixtures(stub_models)
+    factory, default_iterations = CASES[name]
+    iterations = iterations or default_iterations
+
+    operation = factory()
+    if stub_models:
+        install_stub_models()
+    for _ in range(min(5, iterations)):
+        operation()
+
+    latencies = np.empty(iterations)
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        operation()
+        latencies[i] = time.perf_counter() - t0
+    total = time.perf_counter() - start
+
+    result = {
+        "iterations": iterations,
+        "throughput": iterations / total,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(json.dumps(result))
+
+
+# Function to flag metrics that regressed by more than the tolerance.
+# Latency changes below min_delta_ms are ignored as timer noise.
+def compare(results, baseline, tolerance, min_delta_ms=0.5):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']:.1f}/s < {base['throughput']:.1f}/s")
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > min_delta_ms:
+                regressions.append(f"{name}: {key} {result[key]:.2f} > {base[key]:.2f}")
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak_rss_mb {result['peak_rss_mb']:.1f} > {base['peak_rss_mb']:.1f}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument("--iterations", type=int, help="Override per-case iteration counts")
+    parser.add_argument("--stub-models", action="store_true", help="Replace the Keras models with a stub")
+    parser.add_argument("--output", default=DEFAULT_RESULTS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args.run_case, args.iterations, args.stub_models)
+        return
+
+    results = {}
+    for name in args.cases:
+        command = [sys.executable, __file__, "--run-case", name]
+        if args.iterations:
+            command += ["--iterations", str(args.iterations)]
+        if args.stub_models:
+            command.append("--stub-models")
+        completed = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr)
+            raise SystemExit(f"Benchmark case '{name}' failed.")
+
+        results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+        r = results[name]
+        print(
+            f"{name:24} | {r['throughput']:8.1f}/s | p50 {r['p50_ms']:8.2f} ms | "
+            f"p95 {r['p95_ms']:8.2f} ms | p99 {r['p99_ms']:8.2f} ms | {r['peak_rss_mb']:7.1f} MB"
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to '{args.output}'")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to '{args.baseline}'")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against, run with --save-baseline first.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise SystemExit(1)
+    print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
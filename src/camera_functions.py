@@ -1,26 +1,81 @@
-import numpy as np
+import os
 from PIL import Image
 from io import BytesIO
 from tensorflow.keras.models import load_model
 
+from image_preprocessing import preprocess_image
+from decode_pool import create_decode_pool
+from camera_stream import open_frame_source, process_stream, RollingRisk
+from metrics import STAGE_SECONDS, BATCH_SIZE
+from model_loading import register_model_loader
+from runtime_config import batch_cap
+
+# Optional process pool for image decoding, 0 keeps decoding on the request
+# thread. Each process that decodes starts its own pool on first use.
+DECODE_POOL_SIZE = int(os.getenv("DECODE_POOL_SIZE", "0"))
+decode_pool = create_decode_pool(DECODE_POOL_SIZE)
+
 # Load the model
 model_path = "analysis/wildfire_detection_model.keras"
-model = load_model(model_path)
+model = None
+
 
-# Function to preprocess the image before prediction
-def preprocess_image(img):
-    img_resized = img.resize((224, 224))
-    img_array = np.array(img_resized)
-    img_array = img_array / 255.0
+def load_camera_model():
+    global model
+    model = load_model(model_path)
 
-    return np.expand_dims(img_array, axis=0)
 
+register_model_loader(load_camera_model)
+
+# Stream ingestion settings
+STREAM_SAMPLE_FPS = float(os.getenv("STREAM_SAMPLE_FPS", "1.0"))
+STREAM_HASH_THRESHOLD = int(os.getenv("STREAM_HASH_THRESHOLD", "5"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "16"))
+STREAM_RISK_WINDOW = int(os.getenv("STREAM_RISK_WINDOW", "30"))
+# camera_id comes from the client, so only this many cameras are tracked
+STREAM_MAX_CAMERAS = int(os.getenv("STREAM_MAX_CAMERAS", "10000"))
+
+camera_risk = RollingRisk(window=STREAM_RISK_WINDOW, max_cameras=STREAM_MAX_CAMERAS)
 
 
 # Function to predict wildfire probability using camera image
 def camera_cnn_predict(image_file):
-    image = Image.open(BytesIO(image_file.read())).convert("RGB")
-    preprocessed_image = preprocess_image(image)
-    prediction = model.predict(preprocessed_image)[0][0]
+    image_bytes = image_file.read()
+    if decode_pool is not None:
+        with STAGE_SECONDS.time(stage="decode"):
+            preprocessed_image = decode_pool.decode(image_bytes)
+    else:
+        with STAGE_SECONDS.time(stage="decode"):
+            image = Image.open(BytesIO(image_bytes)).convert("RGB")
+        with STAGE_SECONDS.time(stage="preprocess"):
+            preprocessed_image = preprocess_image(image)
+    BATCH_SIZE.observe(1, model="camera")
+    with STAGE_SECONDS.time(stage="camera_inference"):
+        prediction = model.predict(preprocessed_image)[0][0]
 
     return prediction
+
+
+# Function to predict wildfire probabilities for a preprocessed batch.
+# The model outputs P(no fire) since *fire* (0) sorts before *no fire* (1).
+def camera_cnn_predict_batch(batch):
+    BATCH_SIZE.observe(len(batch), model="camera")
+    with STAGE_SECONDS.time(stage="camera_inference"):
+        predictions = model.predict(batch, batch_size=batch_cap("camera"), verbose=0)[:, 0]
+
+    return 1.0 - predictions
+
+
+# Function to score an uploaded video or MJPEG stream for one camera
+def camera_stream_predict(stream_file, filename, camera_id, sample_fps=None):
+    frames = open_frame_source(stream_file, filename)
+    result = process_stream(
+        frames,
+        camera_cnn_predict_batch,
+        sample_fps=STREAM_SAMPLE_FPS if sample_fps is None else sample_fps,
+        hash_threshold=STREAM_HASH_THRESHOLD,
+        batch_size=STREAM_BATCH_SIZE,
+    )
+    result["rolling_risk"] = camera_risk.update(camera_id, result["probabilities"])
+
+    return result
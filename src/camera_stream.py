@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from image_preprocessing import IMAGE_SIZE, preprocess_batch
+
+# OpenCV is only needed for container video formats and RTSP sources
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+JPEG_START = b"\xff\xd8"
+JPEG_END = b"\xff\xd9"
+
+MJPEG_EXTENSIONS = (".mjpg", ".mjpeg")
+ANIMATED_EXTENSIONS = (".gif", ".webp", ".png")
+
+
+# Function to split an MJPEG byte stream (raw concatenated JPEGs or a
+# multipart/x-mixed-replace body) into encoded JPEG frames
+def iter_mjpeg_frames(stream, chunk_size=65536):
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+
+        while True:
+            start = buffer.find(JPEG_START)
+            if start < 0:
+                # Keep a trailing 0xff in case a marker is split across chunks
+                del buffer[:-1]
+                break
+            end = buffer.find(JPEG_END, start + 2)
+            if end < 0:
+                del buffer[:start]
+                break
+            yield bytes(buffer[start : end + 2])
+            del buffer[: end + 2]
+
+
+# Function to decode a JPEG frame at the smallest scale that still covers
+# the model input, which is much cheaper than a full-resolution decode
+def decode_jpeg_frame(data):
+    img = Image.open(BytesIO(data))
+    img.draft("RGB", IMAGE_SIZE)
+
+    return img.convert("RGB")
+
+
+# Frame source: MJPEG stream, timestamps derived from the nominal frame rate
+def mjpeg_source(stream, source_fps):
+    for index, data in enumerate(iter_mjpeg_frames(stream)):
+        yield index / source_fps, decode_jpeg_frame(data)
+
+
+# Frame source: animated GIF/WebP/PNG, timestamps from the frame durations
+def animated_image_source(fp):
+    with Image.open(fp) as img:
+        timestamp = 0.0
+        for frame in ImageSequence.Iterator(img):
+            yield timestamp, frame.convert("RGB")
+            timestamp += frame.info.get("duration", 100) / 1000.0
+
+
+# Frame source: video file or RTSP/HTTP URL decoded with OpenCV
+def video_source(path_or_url):
+    if cv2 is None:
+        raise RuntimeError("OpenCV (opencv-python) is required for video streams.")
+
+    capture = cv2.VideoCapture(path_or_url)
+    if not capture.isOpened():
+        raise RuntimeError(f"Could not open video source '{path_or_url}'.")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield timestamp, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        capture.release()
+
+
+# Frame source: uploaded video file, spooled to disk because OpenCV needs a path
+def uploaded_video_source(fp, suffix):
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        while True:
+            chunk = fp.read(1 << 20)
+            if not chunk:
+                break
+            tmp.write(chunk)
+    try:
+        yield from video_source(tmp.name)
+    finally:
+        os.remove(tmp.name)
+
+
+# Function to pick a frame source for an uploaded stream based on its name
+def open_frame_source(fp, filename, source_fps=25.0):
+    suffix = os.path.splitext(filename or "")[1].lower()
+    if suffix in MJPEG_EXTENSIONS:
+        return mjpeg_source(fp, source_fps)
+    if suffix in ANIMATED_EXTENSIONS:
+        return animated_image_source(fp)
+
+    return uploaded_video_source(fp, suffix)
+
+
+# Function to keep at most sample_fps frames per second of stream time
+def sample_frames(frames, sample_fps):
+    interval = 1.0 / sample_fps
+    next_time = None
+    for timestamp, frame in frames:
+        if next_time is None or timestamp >= next_time:
+            next_time = timestamp + interval
+            yield timestamp, frame
+
+
+# Difference hash: 64 bits comparing neighbouring pixels of a 9x8 thumbnail
+def frame_hash(img):
+    thumbnail = img.convert("L").resize((9, 8), Image.BILINEAR)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+# Function to sample, de-duplicate and batch a frame stream through a model.
+# predict_batch takes a float32 batch and returns one probability per frame.
+def process_stream(
+    frames, predict_batch, sample_fps=1.0, hash_threshold=5, batch_size=16
+):
+    stats = {"frames": 0, "sampled": 0, "duplicates": 0, "scored": 0}
+    probabilities = []
+    pending = []
+    last_hash = None
+
+    def flush():
+        if pending:
+            batch = preprocess_batch(pending)
+            probabilities.extend(float(p) for p in predict_batch(batch))
+            stats["scored"] += len(pending)
+            pending.clear()
+
+    def counted(source):
+        for item in source:
+            stats["frames"] += 1
+            yield item
+
+    for _, frame in sample_frames(counted(frames), sample_fps):
+        stats["sampled"] += 1
+
+        # Skip frames that look the same as the last frame sent to the model
+        current_hash = frame_hash(frame)
+        if last_hash is not None and hamming_distance(current_hash, last_hash) <= hash_threshold:
+            stats["duplicates"] += 1
+            continue
+        last_hash = current_hash
+
+        pending.append(frame)
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+
+    stats["probabilities"] = probabilities
+    return stats
+
+
+# Rolling wildfire risk per camera over its most recently scored frames,
+# keeping only the most recently updated cameras
+class RollingRisk:
+    def __init__(self, window=30, max_cameras=10000):
+        self.window = window
+        self.max_cameras = max_cameras
+        self.scores = OrderedDict()
+        self.lock = threading.Lock()
+
+    def update(self, camera_id, probabilities):
+        with self.lock:
+            scores = self.scores.pop(camera_id, None) or deque(maxlen=self.window)
+            self.scores[camera_id] = scores
+            if len(self.scores) > self.max_cameras:
+                self.scores.popitem(last=False)
+            scores.extend(probabilities)
+            return sum(scores) / len(scores) if scores else None
+
+    def get(self, camera_id):
+        with self.lock:
+            scores = self.scores.get(camera_id)
+            return sum(scores) / len(scores) if scores else None
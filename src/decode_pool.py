@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import queue
+import threading
+from io import BytesIO
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import (
+    IMAGE_SIZE,
+    CHANNELS,
+    batch_buffer,
+    load_pixels,
+    scale_pixels,
+)
+from metrics import QUEUE_DEPTH
+
+SLOT_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], CHANNELS)
+SLOT_BYTES = int(np.prod(SLOT_SHAPE))
+
+# Shared pixel slots as seen from inside a worker process
+_worker_shm = None
+_worker_pixels = None
+
+
+# Worker initializer: attach to the shared pixel slots once per process
+def _init_worker(shm_name, slots):
+    global _worker_shm, _worker_pixels
+    # Forked workers share the parent's resource tracker, which keeps owning
+    # (and eventually unlinking) the segment
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_pixels = np.ndarray(
+        (slots,) + SLOT_SHAPE, dtype=np.uint8, buffer=_worker_shm.buf
+    )
+
+
+# Worker task: decode and resize encoded image bytes straight into a slot
+def _decode_into_slot(data, slot):
+    with Image.open(BytesIO(data)) as img:
+        _worker_pixels[slot] = load_pixels(img)
+
+    return slot
+
+
+# Pool of worker processes that decode and resize images off the request
+# thread. Only the encoded bytes are pickled to the workers, the decoded
+# pixels come back through shared memory. The pool starts on first use, and
+# again in a forked child process (e.g. a gunicorn worker), since neither
+# the pool's threads nor its slot bookkeeping survive fork.
+class DecodePool:
+    def __init__(self, workers, slots=None):
+        self.workers = workers
+        self.slots = slots or workers * 2
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self._start()
+            self.pid = os.getpid()
+
+    def _start(self):
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=self.slots * SLOT_BYTES
+        )
+        self.pixels = np.ndarray(
+            (self.slots,) + SLOT_SHAPE, dtype=np.uint8, buffer=self.shm.buf
+        )
+        self.free_slots = queue.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        # Callers take all the slots for a chunk at once, so two callers can
+        # never each hold half of what the other one is waiting for
+        self.acquire_lock = threading.Lock()
+
+        # Fork so that workers start without re-importing the web app;
+        # multiprocessing.Pool starts every worker eagerly
+        context = multiprocessing.get_context("fork")
+        self.pool = context.Pool(
+            self.workers, initializer=_init_worker, initargs=(self.shm.name, self.slots)
+        )
+
+    # Decode one encoded image into a (1, 224, 224, 3) float32 batch
+    def decode(self, data):
+        return self.decode_many([data])
+
+    # Decode several encoded images into one float32 batch
+    def decode_many(self, blobs):
+        self._ensure_started()
+        batch = batch_buffer(len(blobs))
+        for start in range(0, len(blobs), self.slots):
+            chunk = blobs[start : start + self.slots]
+            QUEUE_DEPTH.inc(len(chunk), queue="decode_pool")
+            with self.acquire_lock:
+                slots = [self.free_slots.get() for _ in chunk]
+            pending = []
+            try:
+                for data, slot in zip(chunk, slots):
+                    pending.append(self.pool.apply_async(_decode_into_slot, (data, slot)))
+                for offset, result in enumerate(pending):
+                    slot = result.get()
+                    scale_pixels(self.pixels[slot], batch[start + offset])
+            finally:
+                # When one image fails (e.g. a corrupt upload) the other tasks
+                # may still be writing their slots, which must not be reused
+                # until they are done
+                for result in pending:
+                    result.wait()
+                for slot in slots:
+                    self.free_slots.put(slot)
+                QUEUE_DEPTH.dec(len(chunk), queue="decode_pool")
+
+        return batch
+
+    def close(self):
+        if self.pid != os.getpid():
+            return
+        self.pid = None
+        self.pool.terminate()
+        self.pool.join()
+        del self.pixels
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Function to create a decode pool, or None when the pool is disabled
+def create_decode_pool(workers):
+    if workers <= 0:
+        return None
+
+    return DecodePool(workers)
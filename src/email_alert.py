@@ -1,12 +1,35 @@
+import argparse
 import sqlite3
+import time
 from mailersend import emails
 import os
 
 from satellite_functions import satellite_cnn_predict
+from imagery_client import ImageryUnavailable
 from meteorological_functions import weather_data_predict
+from risk_history import risk_history, risk_trend
+
+from metrics import (
+    ALERT_METRICS_PATH,
+    ALERTS_PROCESSED,
+    ALERT_LAST_RUN,
+    ERRORS,
+    STAGE_SECONDS,
+    load_snapshot,
+    merge_snapshot,
+    save_snapshot,
+)
+
+from profiling import profile_unit
+from file_lock import FileLock
+import model_loading
 
 from jinja2 import Template
 
+# Held for the whole run, so a run started while an earlier one is still
+# sending (e.g. after the scheduling web worker was recycled) does nothing
+ALERT_JOB_LOCK_PATH = os.getenv("ALERT_JOB_LOCK_PATH", "alert_job.lock")
+
 # Connect to the alerts database
 def fetch_alerts():
     conn = sqlite3.connect("alerts.db")
@@ -24,26 +47,48 @@ def generate_report(email, latitude, longitude):
     crop_amount = 35
     save_path = "satellite_image.png"
 
-    satellite_prediction = satellite_cnn_predict(
-        latitude,
-        longitude,
-        output_size=output_size,
-        zoom_level=15,
-        crop_amount=crop_amount,
-        save_path=save_path,
-    )
+    # Without imagery the report falls back to the weather model alone
+    try:
+        satellite_prediction = satellite_cnn_predict(
+            latitude,
+            longitude,
+            output_size=output_size,
+            zoom_level=15,
+            crop_amount=crop_amount,
+            save_path=save_path,
+        )
+    except ImageryUnavailable as e:
+        print(f"Satellite imagery unavailable for {email}: {e}")
+        satellite_prediction = None
 
     weather_prediction = weather_data_predict(latitude, longitude)
 
+    if satellite_prediction is None:
+        average_prediction = weather_prediction
+    else:
+        average_prediction = (satellite_prediction + weather_prediction) / 2
+
+    if risk_history is not None:
+        risk_history.record(
+            latitude,
+            longitude,
+            satellite_prediction,
+            weather_prediction,
+            average_prediction,
+            source="alert",
+        )
+
     report = {
         "email": email,
         "latitude": latitude,
         "longitude": longitude,
-        "satellite_probability": round(satellite_prediction * 100),
-        "weather_probability": round(weather_prediction * 100),
-        "average_probability": round(
-            ((satellite_prediction + weather_prediction) / 2) * 100
+        "satellite_probability": (
+            None if satellite_prediction is None else round(satellite_prediction * 100)
         ),
+        "weather_probability": round(weather_prediction * 100),
+        "average_probability": round(average_prediction * 100),
+        # Daily average risk over the past week, read from the rollups
+        "trend": risk_trend(latitude, longitude),
     }
 
     return report
@@ -72,9 +117,16 @@ def prepare_email_content(report):
                 <li><strong>Email:</strong> {{ report.email }}</li>
                 <li><strong>Latitude:</strong> {{ report.latitude }}</li>
                 <li><strong>Longitude:</strong> {{ report.longitude }}</li>
+                {% if report.satellite_probability is none %}
+                <li><strong>Satellite Probability:</strong> imagery unavailable, weather only</li>
+                {% else %}
                 <li><strong>Satellite Probability:</strong> {{ report.satellite_probability }}%</li>
+                {% endif %}
                 <li><strong>Weather Probability:</strong> {{ report.weather_probability }}%</li>
                 <li><strong>Average Probability:</strong> {{ report.average_probability }}%</li>
+                {% if report.trend %}
+                <li><strong>Trend (past {{ report.trend.days }} days):</strong> {{ report.trend.direction }}, {{ report.trend["values"] | join("% → ") }}%</li>
+                {% endif %}
             </ul>
             <p>Stay safe!</p>
         </div>
@@ -104,19 +156,50 @@ def send_email(report, email_content):
     mailer.set_subject("Wildfire Risk Report for Your Area", mail_body)
     mailer.set_html_content(email_content, mail_body)
 
-    response = mailer.send(mail_body)
+    with STAGE_SECONDS.time(stage="email_send"):
+        response = mailer.send(mail_body)
     print(f"Email sent to {report['email']} with response: {response}")
 
 
 # Main function to process all alerts
 def process_alerts():
+    # Keep accumulating the job's metrics across hourly runs
+    merge_snapshot(load_snapshot(ALERT_METRICS_PATH))
+
     alerts = fetch_alerts()
-    for alert in alerts:
-        email, latitude, longitude = alert
-        report = generate_report(email, latitude, longitude)
-        email_content = prepare_email_content(report)
-        send_email(report, email_content)
+    try:
+        for alert in alerts:
+            email, latitude, longitude = alert
+            try:
+                report = generate_report(email, latitude, longitude)
+                email_content = prepare_email_content(report)
+                send_email(report, email_content)
+            except Exception:
+                ERRORS.inc(stage="alert")
+                raise
+            ALERTS_PROCESSED.inc()
+    finally:
+        ALERT_LAST_RUN.set(time.time())
+        save_snapshot(ALERT_METRICS_PATH)
+        if risk_history is not None:
+            risk_history.close()
 
 
 if __name__ == "__main__":
-    process_alerts()
+    parser = argparse.ArgumentParser(description="Send hourly wildfire alert emails")
+    parser.add_argument(
+        "--profile", action="store_true", help="Capture a CPU and memory profile of this run"
+    )
+    args = parser.parse_args()
+
+    # Started by a gunicorn worker, the job inherits DEFER_MODEL_LOADING from
+    # its environment; this process never forks, so load the models now
+    if model_loading.DEFER_MODEL_LOADING:
+        model_loading.load_models()
+
+    run_lock = FileLock(ALERT_JOB_LOCK_PATH)
+    if not run_lock.try_acquire():
+        print("Another alert run is still in progress, skipping this run.")
+    else:
+        with profile_unit("alert_job", enabled=args.profile):
+            process_alerts()
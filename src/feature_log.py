@@ -0,0 +1,157 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from metrics import ERRORS, QUEUE_DEPTH
+
+FEATURE_COLUMNS = ["Temperature", "RH", "Ws", "Rain", "FFMC", "DMC", "DC", "ISI", "BUI", "FWI"]
+LOG_COLUMNS = (
+    ["timestamp", "latitude", "longitude"] + FEATURE_COLUMNS + ["raw_prediction", "prediction"]
+)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".npz"
+
+
+# Append-only log of weather features served by weather_data_predict.
+# Rows are queued without blocking the request and a background thread
+# writes them out as immutable, compressed columnar segments. The oldest
+# segments are deleted once the directory grows beyond max_bytes.
+class FeatureLog:
+    def __init__(
+        self, directory, segment_rows=10000, flush_seconds=60.0, max_bytes=256 * 1024 * 1024,
+        queue_size=10000,
+    ):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    # Start the writer thread lazily, and again in a forked child process
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self.thread = threading.Thread(target=self._run, name="feature-log", daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+            atexit.register(self.close)
+
+    # Function to queue one row, dropping it rather than waiting when full
+    def log(self, row):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(tuple(float(row[column]) for column in LOG_COLUMNS))
+        except queue.Full:
+            ERRORS.inc(stage="feature_log_dropped")
+            return
+        QUEUE_DEPTH.set(self.queue.qsize(), queue="feature_log")
+
+    # Function to write queued rows and stop the writer thread
+    def close(self, timeout=5.0):
+        if self.pid != os.getpid():
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.pid = None
+
+    def _run(self):
+        rows = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                row = ()
+
+            if row is None:
+                self._write_segment(rows)
+                return
+            if row:
+                rows.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+
+            if len(rows) >= self.segment_rows or (rows and time.monotonic() >= deadline):
+                self._write_segment(rows)
+                rows = []
+                deadline = None
+                QUEUE_DEPTH.set(self.queue.qsize(), queue="feature_log")
+
+    def _write_segment(self, rows):
+        if not rows:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            table = np.array(rows, dtype=np.float64)
+            columns = {column: table[:, i] for i, column in enumerate(LOG_COLUMNS)}
+            # Segment names sort by the time they are written, after their
+            # last row was logged; the pid keeps the web app and the alert
+            # job from colliding
+            name = f"{SEGMENT_PREFIX}{time.time_ns():020d}-{os.getpid()}{SEGMENT_SUFFIX}"
+            tmp_path = os.path.join(self.directory, "." + name)
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **columns)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+            enforce_size_limit(self.directory, self.max_bytes)
+        except OSError as e:
+            ERRORS.inc(stage="feature_log")
+            print(f"Error writing feature log segment: {e}")
+
+
+# Function to list segment names in the order they were written
+def list_segments(directory):
+    if not os.path.isdir(directory):
+        return []
+
+    return sorted(
+        name
+        for name in os.listdir(directory)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+# Function to delete the oldest segments until the log fits in max_bytes
+def enforce_size_limit(directory, max_bytes):
+    segments = list_segments(directory)
+    sizes = [os.path.getsize(os.path.join(directory, name)) for name in segments]
+    total = sum(sizes)
+    for name, size in zip(segments, sizes):
+        if total <= max_bytes:
+            break
+        os.remove(os.path.join(directory, name))
+        total -= size
+
+
+# Function to get the unix time a segment was written from its name; every
+# row in it was logged before then
+def segment_time(name):
+    return int(name[len(SEGMENT_PREFIX):].split("-")[0]) / 1e9
+
+
+# Function to read segments, yielding (segment name, {column: array}).
+# Segments named in `skip` are left out, and so are segments written after
+# `written_before` when given. A name is taken just before its segment is
+# written out, so another process can still publish an earlier-named segment
+# after a later one; readers track the names they consumed rather than the
+# last one.
+def read_segments(directory, skip=(), written_before=None):
+    for name in list_segments(directory):
+        if name in skip:
+            continue
+        if written_before is not None and segment_time(name) > written_before:
+            continue
+        with np.load(os.path.join(directory, name)) as segment:
+            yield name, {column: segment[column] for column in segment.files}
@@ -0,0 +1,42 @@
+import fcntl
+import os
+
+
+# Non-blocking exclusive lock on a file, held until release() or until the
+# process exits. Uses POSIX record locks (lockf), which forked children do
+# not inherit, so a process pool forked by the holder cannot keep the lock
+# alive after the holder dies. The lock file records the holder's pid.
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.pid = None
+
+    def held(self):
+        return self.fd is not None and self.pid == os.getpid()
+
+    # Returns True when this process holds the lock
+    def try_acquire(self):
+        if self.held():
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self.fd = fd
+        self.pid = os.getpid()
+        return True
+
+    def release(self):
+        if not self.held():
+            return
+        # Closing the descriptor drops the lock
+        os.close(self.fd)
+        self.fd = None
+        self.pid = None
@@ -0,0 +1,71 @@
+"""
+Production server settings, run from the repository root:
+
+    gunicorn -c src/gunicorn.conf.py
+
+The app is imported once in the master process (preload_app) and the
+workers are forked from it, so the Python runtime, TensorFlow, the weather
+scaler and the tile pack are shared copy-on-write between workers. The
+Keras models themselves are loaded by each worker right after the fork,
+since TensorFlow's runtime does not survive fork. Exactly one worker runs
+the hourly alert job (see start_alert_scheduler in app.py) and workers are
+recycled after GUNICORN_MAX_REQUESTS requests.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+wsgi_app = "app:app"
+pythonpath = "src"
+bind = f"0.0.0.0:{os.getenv('PORT', '4000')}"
+
+preload_app = True
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Inference requests mostly wait on TensorFlow, image providers and the
+# admission queues. Threads per worker must exceed the admission limits in
+# admission.py, otherwise excess requests wait for a thread where admission
+# control cannot see (or shed) them. The worker is gthread, recycling
+# without dropping connections (see gunicorn_worker.py).
+worker_class = "gunicorn_worker.DrainingThreadWorker"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# Recycling bounds slow memory growth; the jitter keeps workers from
+# restarting all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+
+worker_metrics_dir = os.getenv("WORKER_METRICS_DIR", "worker_metrics")
+raw_env = [
+    "DEFER_MODEL_LOADING=true",
+    f"WORKER_METRICS_DIR={worker_metrics_dir}",
+]
+
+
+def when_ready(server):
+    from app import init_db
+
+    # Metrics of workers from a previous run
+    shutil.rmtree(worker_metrics_dir, ignore_errors=True)
+    init_db()
+
+
+def pre_fork(server, worker):
+    from app import before_fork
+
+    before_fork()
+
+
+def post_fork(server, worker):
+    from app import after_fork
+
+    after_fork()
+
+
+def child_exit(server, worker):
+    try:
+        os.remove(os.path.join(worker_metrics_dir, f"web-{worker.pid}.json"))
+    except FileNotFoundError:
+        pass
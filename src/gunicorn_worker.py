@@ -0,0 +1,33 @@
+import sys
+import time
+
+from gunicorn.workers.gthread import ThreadWorker
+
+
+# gthread worker that recycles without dropping connections. The stock
+# worker leaves its event loop as soon as it reaches max_requests, closing
+# any connection it has accepted but not yet read a request from. This one
+# first stops accepting, lets the other workers take new connections, and
+# exits once its open connections are done (or after graceful_timeout).
+class DrainingThreadWorker(ThreadWorker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Recycling is handled here, on the event loop thread
+        self.recycle_after = self.max_requests
+        self.max_requests = sys.maxsize
+        self.drain_deadline = None
+
+    # Called by the event loop on every iteration
+    def murder_keepalived(self):
+        super().murder_keepalived()
+        if self.drain_deadline is None and self.nr >= self.recycle_after:
+            self.log.info("Autorestarting worker, draining open connections.")
+            self.drain_deadline = time.monotonic() + self.cfg.graceful_timeout
+            with self._lock:
+                for sock in self.sockets:
+                    self.poller.unregister(sock)
+
+        if self.drain_deadline is not None and (
+            self.nr_conns == 0 or time.monotonic() > self.drain_deadline
+        ):
+            self.alive = False
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Input size expected by both ResNet50v2-based CNNs
+IMAGE_SIZE = (224, 224)
+CHANNELS = 3
+
+# Per-thread float32 batch buffers, reused across calls to avoid a fresh
+# allocation (and a float64 intermediate) for every inference
+_buffers = threading.local()
+
+
+# Function to get a reusable float32 buffer for a batch of n images
+def batch_buffer(n):
+    buffer = getattr(_buffers, "batch", None)
+    if buffer is None or buffer.shape[0] < n:
+        buffer = np.empty((n, IMAGE_SIZE[1], IMAGE_SIZE[0], CHANNELS), dtype=np.float32)
+        _buffers.batch = buffer
+
+    return buffer[:n]
+
+
+# Function to turn a PIL image into a 224x224 RGB uint8 pixel array
+def load_pixels(img):
+    # Satellite tiles can come back as RGBA or palette images
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != IMAGE_SIZE:
+        img = img.resize(IMAGE_SIZE)
+
+    return np.asarray(img, dtype=np.uint8)
+
+
+# Function to scale uint8 pixels into a float32 slot in place
+def scale_pixels(pixels, out):
+    np.divide(pixels, np.float32(255.0), out=out)
+
+    return out
+
+
+# Function to scale a sequence of uint8 pixel arrays into a float32 batch
+def pixels_to_batch(pixel_arrays):
+    batch = batch_buffer(len(pixel_arrays))
+    for slot, pixels in zip(batch, pixel_arrays):
+        scale_pixels(pixels, slot)
+
+    return batch
+
+
+# Function to preprocess a single image into a (1, 224, 224, 3) float32 batch.
+# The returned array is a view of this thread's reusable buffer and is only
+# valid until the next call on the same thread.
+def preprocess_image(img):
+    batch = batch_buffer(1)
+    scale_pixels(load_pixels(img), batch[0])
+
+    return batch
+
+
+# Function to preprocess several images into one float32 batch
+def preprocess_batch(images):
+    batch = batch_buffer(len(images))
+    for slot, img in zip(batch, images):
+        scale_pixels(load_pixels(img), slot)
+
+    return batch
+
+
+# Function to open and preprocess an image from a path or file-like object
+def preprocess_file(fp):
+    with Image.open(fp) as img:
+        return preprocess_image(img)
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import ERRORS, Counter, Gauge
+
+load_dotenv()
+MAPBOX_TOKEN = os.getenv("MAPBOX_TOKEN")
+MAPBOX_API_URL = os.getenv("MAPBOX_API_URL", "https://api.mapbox.com")
+
+# Connect and read timeouts in seconds, retries for connection errors and
+# 429/5xx responses, and the number of pooled keep-alive connections
+IMAGERY_CONNECT_TIMEOUT = float(os.getenv("IMAGERY_CONNECT_TIMEOUT", "3.05"))
+IMAGERY_READ_TIMEOUT = float(os.getenv("IMAGERY_READ_TIMEOUT", "10"))
+IMAGERY_RETRIES = int(os.getenv("IMAGERY_RETRIES", "2"))
+IMAGERY_POOL_SIZE = int(os.getenv("IMAGERY_POOL_SIZE", "16"))
+# Consecutive failures that open the circuit, and how long it stays open
+IMAGERY_BREAKER_FAILURES = int(os.getenv("IMAGERY_BREAKER_FAILURES", "5"))
+IMAGERY_BREAKER_RESET_SECONDS = float(os.getenv("IMAGERY_BREAKER_RESET_SECONDS", "30"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+IMAGERY_REQUESTS = Counter(
+    "wildfire_imagery_requests_total",
+    "Imagery provider requests by result (ok, not_found, error, circuit_open).",
+    ["result"],
+)
+CIRCUIT_OPEN = Gauge(
+    "wildfire_circuit_breaker_open",
+    "1 while a circuit breaker is failing calls fast, else 0.",
+    ["client"],
+)
+
+
+# Raised when imagery cannot be fetched; callers degrade instead of failing
+class ImageryUnavailable(Exception):
+    pass
+
+
+# Raised without calling the provider while the circuit breaker is open
+class CircuitOpen(ImageryUnavailable):
+    pass
+
+
+# Circuit breaker: opens after `failures` consecutive failures, fails fast
+# for `reset_seconds`, then lets a single trial call through (half-open)
+# and closes again if it succeeds
+class CircuitBreaker:
+    def __init__(self, name, failures, reset_seconds):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+        CIRCUIT_OPEN.set(0, client=name)
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if retry_in > 0 or self.trial_in_flight:
+                raise CircuitOpen(
+                    f"{self.name} is unavailable, retrying in {max(retry_in, 0):.0f}s"
+                )
+            self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+        CIRCUIT_OPEN.set(0, client=self.name)
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is None and self.consecutive_failures < self.failures:
+                return
+            self.opened_at = time.monotonic()
+        CIRCUIT_OPEN.set(1, client=self.name)
+
+
+# HTTP client for the imagery provider: keep-alive connection pool, bounded
+# timeouts and retries, behind a circuit breaker. Each process (e.g. each
+# gunicorn worker) gets its own session, since pooled sockets must not be
+# shared across fork.
+class ImageryClient:
+    def __init__(self, base_url, token, breaker):
+        self.base_url = base_url
+        self.token = token
+        self.breaker = breaker
+        self.session = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def _session(self):
+        if self.pid == os.getpid():
+            return self.session
+        with self.lock:
+            if self.pid != os.getpid():
+                retry = Retry(
+                    total=IMAGERY_RETRIES,
+                    backoff_factor=0.25,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=["GET"],
+                    raise_on_status=False,
+                    # urllib3 sleeps for the whole Retry-After with no cap,
+                    # holding the request thread and its admission slot
+                    respect_retry_after_header=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=IMAGERY_POOL_SIZE, max_retries=retry
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.session = session
+                self.pid = os.getpid()
+
+        return self.session
+
+    # Function to GET an image from the provider, returning its bytes
+    def get(self, path):
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            IMAGERY_REQUESTS.inc(result="circuit_open")
+            raise
+
+        try:
+            response = self._session().get(
+                f"{self.base_url}{path}",
+                params={"access_token": self.token},
+                timeout=(IMAGERY_CONNECT_TIMEOUT, IMAGERY_READ_TIMEOUT),
+            )
+        except requests.RequestException as e:
+            self._failed()
+            raise ImageryUnavailable(f"Imagery request failed: {type(e).__name__}") from e
+
+        if response.status_code == 200:
+            self.breaker.record_success()
+            IMAGERY_REQUESTS.inc(result="ok")
+            return response.content
+
+        if response.status_code in RETRY_STATUSES:
+            self._failed()
+        else:
+            # The provider is up but refused the request, e.g. 404 outside
+            # its coverage or 401 for a bad token
+            self.breaker.record_success()
+            IMAGERY_REQUESTS.inc(result="not_found" if response.status_code == 404 else "error")
+            ERRORS.inc(stage="tile_fetch")
+        raise ImageryUnavailable(f"Imagery provider returned HTTP {response.status_code}")
+
+    def _failed(self):
+        self.breaker.record_failure()
+        IMAGERY_REQUESTS.inc(result="error")
+        ERRORS.inc(stage="tile_fetch")
+
+    # Function to fetch a Mapbox static satellite image centred on a point
+    def static_image(self, longitude, latitude, zoom, width, height):
+        return self.get(
+            f"/styles/v1/mapbox/satellite-v9/static/{longitude},{latitude},{zoom}/{width}x{height}"
+        )
+
+    # Function to fetch a 512x512 Mapbox satellite raster tile
+    def tile(self, z, x, y):
+        return self.get(f"/v4/mapbox.satellite/{z}/{x}/{y}@2x.jpg90")
+
+
+imagery_client = ImageryClient(
+    MAPBOX_API_URL,
+    MAPBOX_TOKEN,
+    CircuitBreaker("mapbox", IMAGERY_BREAKER_FAILURES, IMAGERY_BREAKER_RESET_SECONDS),
+)
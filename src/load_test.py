@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Overload test for the inference routes
+Drives a route with more concurrent clients than it can serve and reports
+throughput, shed requests and latency percentiles per priority class.
+With --local the app runs in-process on the offline fixtures of
+benchmark_suite.py, with a stub model that takes --service-ms per call,
+once without and once with admission control.
+"""
+
+import argparse
+import logging
+import threading
+import time
+from collections import defaultdict
+from io import BytesIO
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+import benchmark_suite
+
+
+class SlowStubModel(benchmark_suite.StubModel):
+    """Stub model taking a fixed inference time on one of `cores` CPUs"""
+
+    def __init__(self, service_time, cpus):
+        self.service_time = service_time
+        self.cpus = cpus
+
+    def predict(self, x, verbose=0, batch_size=None):
+        with self.cpus:
+            time.sleep(self.service_time)
+        return super().predict(x, verbose, batch_size)
+
+
+def start_local_app(service_time, cores):
+    benchmark_suite.install_fixtures(stub_models=True)
+
+    import admission
+    import app
+    import camera_functions
+    import satellite_functions
+
+    cpus = threading.Semaphore(cores)
+    satellite_functions.model = SlowStubModel(service_time, cpus)
+    camera_functions.model = SlowStubModel(service_time, cpus)
+    # Every client shares 127.0.0.1, so per-client limits would hide the queue
+    admission.client_limiter.rate = 0
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", admission
+
+
+def send(session, base_url, route, bulk, image):
+    headers = {"X-Priority": "bulk"} if bulk else {}
+    if route == "camera":
+        return session.post(
+            f"{base_url}/camera_predict",
+            files={"image": ("frame.jpg", BytesIO(image), "image/jpeg")},
+            headers=headers,
+            timeout=60,
+        )
+
+    return session.post(
+        f"{base_url}/satellite_predict",
+        json={"location": [-122.42, 37.77], "zoom": 15},
+        headers=headers,
+        timeout=60,
+    )
+
+
+def run_load(base_url, route, clients, duration, bulk_fraction):
+    image = benchmark_suite.make_jpeg(1280, 720)
+    latencies = defaultdict(list)
+    statuses = defaultdict(int)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(index):
+        bulk = index < clients * bulk_fraction
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            response = send(session, base_url, route, bulk, image)
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    latencies["bulk" if bulk else "interactive"].append(elapsed)
+            if response.status_code in (429, 503):
+                # Well-behaved clients back off, capped to keep the load on
+                time.sleep(min(float(response.headers.get("Retry-After", 1)), 1.0))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return statuses, latencies
+
+
+def report(title, statuses, latencies, duration):
+    print(f"\n{title}")
+    print(f"  responses: {dict(sorted(statuses.items()))}")
+    print(f"  served: {statuses.get(200, 0) / duration:.1f} req/s")
+    for priority, values in sorted(latencies.items()):
+        ms = np.array(values) * 1000
+        print(
+            f"  {priority:11} p50 {np.percentile(ms, 50):8.1f} ms | "
+            f"p95 {np.percentile(ms, 95):8.1f} ms | p99 {np.percentile(ms, 99):8.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running app")
+    parser.add_argument("--local", action="store_true", help="Run the app in-process on stubs")
+    parser.add_argument("--route", choices=["satellite", "camera"], default="satellite")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--bulk-fraction", type=float, default=0.5)
+    parser.add_argument("--service-ms", type=float, default=100.0, help="Stub inference time (--local)")
+    parser.add_argument("--cores", type=int, default=4, help="Stub inference capacity (--local)")
+    args = parser.parse_args()
+
+    if args.local:
+        base_url, admission = start_local_app(args.service_ms / 1000, args.cores)
+        for enabled in (False, True):
+            admission.ADMISSION_ENABLED = enabled
+            statuses, latencies = run_load(base_url, args.route, args.clients, args.duration, args.bulk_fraction)
+            report(f"Admission control {'on' if enabled else 'off'}", statuses, latencies, args.duration)
+        return
+
+    if not args.url:
+        parser.error("either --url or --local is required")
+    statuses, latencies = run_load(args.url, args.route, args.clients, args.duration, args.bulk_fraction)
+    report(f"{args.url} /{args.route}_predict", statuses, latencies, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,32 @@ import requests_cache
 from retry_requests import retry
 from datetime import datetime
 import joblib
+import os
+import time
+
+from metrics import STAGE_SECONDS, CACHE_REQUESTS, ERRORS
+from feature_log import FeatureLog
+from model_loading import register_model_loader
+
+model = None
+
 
 # Try to load the model - handle both Keras and sklearn models
-try:
-    model = __import__("tensorflow").keras.models.load_model(
-        "analysis/meteorological-detection-classification.keras"
-    )
-except:
+def load_weather_model():
+    global model
     try:
-        model = joblib.load("analysis/meteorological-detection-classification.keras")
+        model = __import__("tensorflow").keras.models.load_model(
+            "analysis/meteorological-detection-classification.keras"
+        )
     except:
-        print("Warning: Could not load weather model. Using fallback prediction.")
-        model = None
+        try:
+            model = joblib.load("analysis/meteorological-detection-classification.keras")
+        except:
+            print("Warning: Could not load weather model. Using fallback prediction.")
+            model = None
+
+
+register_model_loader(load_weather_model)
 
 try:
     std_scaler = joblib.load("analysis/std_scaler_weather.pkl")
@@ -24,12 +38,34 @@ except:
     print("Warning: Could not load weather scaler. Using fallback prediction.")
     std_scaler = None
 
+# Log served features for incremental retraining (see retrain_weather_model.py)
+FEATURE_LOG_ENABLED = os.getenv("FEATURE_LOG_ENABLED", "true").lower() == "true"
+feature_log = None
+if FEATURE_LOG_ENABLED:
+    feature_log = FeatureLog(
+        os.getenv("FEATURE_LOG_DIR", "feature_log"),
+        segment_rows=int(os.getenv("FEATURE_LOG_SEGMENT_ROWS", "10000")),
+        flush_seconds=float(os.getenv("FEATURE_LOG_FLUSH_SECONDS", "60")),
+        max_bytes=int(os.getenv("FEATURE_LOG_MAX_MB", "256")) * 1024 * 1024,
+    )
+
 # Setup the Open-Meteo API client with cache and retry on error
 cache_session = requests_cache.CachedSession(".cache", expire_after=3600)
 retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
 openmeteo = openmeteo_requests.Client(session=retry_session)
 
 
+# Count weather cache hits and misses; requests_cache marks every response
+# it returns with from_cache
+def record_weather_cache(response, *args, **kwargs):
+    from_cache = getattr(response, "from_cache", None)
+    if from_cache is not None:
+        CACHE_REQUESTS.inc(cache="weather", result="hit" if from_cache else "miss")
+
+
+cache_session.hooks["response"].append(record_weather_cache)
+
+
 # Function to fetch weather data from Open-Meteo API
 def fetch_weather_data(latitude, longitude):
     url = "https://api.open-meteo.com/v1/forecast"
@@ -183,7 +219,8 @@ def calculate_fwi(isi, bui):
 # Function to predict wildfire probability using weather data
 def weather_data_predict(latitude, longitude):
     try:
-        response = fetch_weather_data(latitude, longitude)
+        with STAGE_SECONDS.time(stage="weather_fetch"):
+            response = fetch_weather_data(latitude, longitude)
         temperature, relative_humidity, precipitation, rain, wind_speed = (
             preprocess_weather_data(response)
         )
@@ -210,13 +247,14 @@ def weather_data_predict(latitude, longitude):
         month = datetime.now().month
 
         # Calculate indices
-        ffmc = calculate_ffmc(temperature, relative_humidity,
-                              wind_speed, rain, ffmc_prev)
-        dmc = calculate_dmc(temperature, relative_humidity, rain, dmc_prev, month)
-        dc = calculate_dc(temperature, rain, dc_prev, month)
-        isi = calculate_isi(ffmc, wind_speed)
-        bui = calculate_bui(dmc, dc)
-        fwi = calculate_fwi(isi, bui)
+        with STAGE_SECONDS.time(stage="fwi"):
+            ffmc = calculate_ffmc(temperature, relative_humidity,
+                                  wind_speed, rain, ffmc_prev)
+            dmc = calculate_dmc(temperature, relative_humidity, rain, dmc_prev, month)
+            dc = calculate_dc(temperature, rain, dc_prev, month)
+            isi = calculate_isi(ffmc, wind_speed)
+            bui = calculate_bui(dmc, dc)
+            fwi = calculate_fwi(isi, bui)
 
         # Create a dataset
         data = {
@@ -240,9 +278,10 @@ def weather_data_predict(latitude, longitude):
             print("Using fallback FWI-based prediction")
             raw_prediction = 0.5  # Neutral prediction
         else:
-            df = std_scaler.transform(df)
-            # Get raw prediction
-            raw_prediction = model.predict(df)[0][0]
+            with STAGE_SECONDS.time(stage="weather_inference"):
+                df = std_scaler.transform(df)
+                # Get raw prediction
+                raw_prediction = model.predict(df)[0][0]
         
         # Apply additional logic to prevent unrealistic 100% predictions
         # Based on FWI thresholds and weather conditions
@@ -267,9 +306,31 @@ def weather_data_predict(latitude, longitude):
         
         # Ensure prediction is within reasonable bounds
         final_prediction = max(0.05, min(0.95, final_prediction))
+
+        if feature_log is not None:
+            feature_log.log(
+                {
+                    "timestamp": time.time(),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "Temperature": temperature,
+                    "RH": relative_humidity,
+                    "Ws": wind_speed,
+                    "Rain": rain,
+                    "FFMC": ffmc,
+                    "DMC": dmc,
+                    "DC": dc,
+                    "ISI": isi,
+                    "BUI": bui,
+                    "FWI": fwi,
+                    "raw_prediction": raw_prediction,
+                    "prediction": final_prediction,
+                }
+            )
         
         return final_prediction
         
     except Exception as e:
+        ERRORS.inc(stage="weather")
         print(f"Error in weather prediction: {e}")
         return 0.1  # Default low risk on error
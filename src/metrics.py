@@ -0,0 +1,265 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow provider calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Metrics written by the hourly alert job, merged into /metrics
+ALERT_METRICS_PATH = os.getenv("ALERT_METRICS_PATH", "alert_metrics.json")
+# Directory where each web worker publishes its metrics when the app runs
+# under gunicorn, so any worker can answer /metrics for all of them
+WORKER_METRICS_DIR = os.getenv("WORKER_METRICS_DIR")
+
+
+# Base class for a metric family with a fixed set of label names
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, key, value):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def merge(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self, key, value):
+        yield self.name, key, value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    # Context manager recording the duration of the enclosed block
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, key, value):
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                self.values[key] = {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                return
+            state["buckets"] = [a + b for a, b in zip(state["buckets"], value["buckets"])]
+            state["sum"] += value["sum"]
+            state["count"] += value["count"]
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [list(key), {"buckets": list(state["buckets"]), "sum": state["sum"], "count": state["count"]}]
+                for key, state in self.values.items()
+            ]
+
+    def samples(self, key, state):
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["buckets"]):
+            cumulative += count
+            yield self.name + "_bucket", key + (("le", format_value(bound)),), cumulative
+        yield self.name + "_bucket", key + (("le", "+Inf"),), state["count"]
+        yield self.name + "_sum", key, state["sum"]
+        yield self.name + "_count", key, state["count"]
+
+
+registry = []
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+# Function to render the registry in the Prometheus text exposition format.
+# Other processes' snapshots are rendered alongside, labelled by process.
+def render_metrics(process="web", other_snapshots=None):
+    other_snapshots = other_snapshots or {}
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        sources = [(process, metric.snapshot())]
+        for other_process, snapshot in other_snapshots.items():
+            sources.append((other_process, snapshot.get(metric.name, [])))
+        for source_process, entries in sources:
+            for label_values, value in entries:
+                pairs = (("process", source_process),) + tuple(zip(metric.labelnames, label_values))
+                for sample_name, sample_labels, sample_value in metric.samples(pairs, value):
+                    lines.append(f"{sample_name}{format_labels(sample_labels)} {format_value(sample_value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# Function to capture every metric's values as JSON-serialisable data
+def snapshot_metrics():
+    return {metric.name: metric.snapshot() for metric in registry}
+
+
+# Function to fold a previous snapshot into the registry, so counters and
+# histograms keep accumulating across separate runs of a job
+def merge_snapshot(snapshot):
+    for metric in registry:
+        for label_values, value in snapshot.get(metric.name, []):
+            metric.merge(tuple(label_values), value)
+
+
+def load_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_snapshot(path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot_metrics(), f)
+    os.replace(tmp_path, path)
+
+
+# Function to save this process' snapshot to `path` every `interval` seconds
+def start_snapshot_writer(path, interval=10.0):
+    def run():
+        while True:
+            try:
+                save_snapshot(path)
+            except OSError as e:
+                print(f"Error saving metrics snapshot: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+# Function to load the snapshots in a directory, keyed by file name without
+# the .json extension, skipping `exclude`
+def load_snapshots(directory, exclude=None):
+    if not directory or not os.path.isdir(directory):
+        return {}
+
+    snapshots = {}
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension == ".json" and name != exclude:
+            snapshots[name] = load_snapshot(os.path.join(directory, filename))
+
+    return snapshots
+
+
+# Metrics shared by the web app and the alert job
+
+STAGE_SECONDS = Histogram(
+    "wildfire_stage_duration_seconds",
+    "Time spent in each prediction stage.",
+    ["stage"],
+)
+BATCH_SIZE = Histogram(
+    "wildfire_batch_size",
+    "Number of images per model call.",
+    ["model"],
+    buckets=BATCH_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "wildfire_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+QUEUE_DEPTH = Gauge(
+    "wildfire_queue_depth",
+    "Work items currently queued or in flight.",
+    ["queue"],
+)
+ERRORS = Counter(
+    "wildfire_errors_total",
+    "Errors by stage.",
+    ["stage"],
+)
+ALERTS_PROCESSED = Counter(
+    "wildfire_alerts_processed_total",
+    "Alert subscriptions processed by the alert job.",
+)
+ALERT_LAST_RUN = Gauge(
+    "wildfire_alert_last_run_timestamp_seconds",
+    "Unix time the alert job last finished.",
+)
@@ -0,0 +1,25 @@
+import os
+
+from runtime_config import apply_runtime_config
+
+# TensorFlow's runtime does not survive fork: a Keras model loaded in the
+# gunicorn master deadlocks on predict() in the forked workers. Modules
+# register their model loaders here; they run at import time as usual,
+# unless loading is deferred (gunicorn.conf.py sets DEFER_MODEL_LOADING),
+# in which case each worker calls load_models() right after it is forked.
+DEFER_MODEL_LOADING = os.getenv("DEFER_MODEL_LOADING", "false").lower() == "true"
+
+_loaders = []
+
+
+def register_model_loader(loader):
+    _loaders.append(loader)
+    if not DEFER_MODEL_LOADING:
+        apply_runtime_config()
+        loader()
+
+
+def load_models():
+    apply_runtime_config()
+    for loader in _loaders:
+        loader()
@@ -0,0 +1,118 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Profiles are kept in a bounded ring buffer on disk
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+# Fraction of requests profiled without being asked, 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Token for the X-Profile request header and the admin endpoints; when it
+# is unset only sampling can trigger a profile
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# tracemalloc is process-wide, so only one unit of work is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def check_token(token):
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# Function to decide whether a request should be profiled
+def profile_requested(header_value):
+    if check_token(header_value):
+        return True
+
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+# Context manager capturing a CPU profile and an allocation snapshot for the
+# enclosed unit of work. Yields the profile id, or None when not profiling
+# (disabled, or another unit is already being profiled).
+@contextmanager
+def profile_unit(name, enabled=True):
+    if not enabled or not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{re.sub(r'[^A-Za-z0-9_-]', '_', name)}"
+        tracemalloc.start(25)
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield profile_id
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            write_profile(profile_id, profiler, before, after, elapsed, peak)
+    finally:
+        _profile_lock.release()
+
+
+# Function to write a profile as a pstats file plus a readable summary
+def write_profile(profile_id, profiler, before, after, elapsed, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile_id)
+    profiler.dump_stats(base + ".prof")
+
+    summary = io.StringIO()
+    summary.write(f"{profile_id}\n")
+    summary.write(f"Wall time: {elapsed * 1000:.1f} ms\n")
+    summary.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n\n")
+    summary.write("Top functions by cumulative time\n")
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(30)
+    summary.write("Top allocations during the unit of work\n")
+    for stat in after.compare_to(before, "lineno")[:20]:
+        summary.write(f"{stat}\n")
+    with open(base + ".txt", "w") as f:
+        f.write(summary.getvalue())
+
+    prune_profiles()
+
+
+# Function to drop the oldest profiles beyond PROFILE_MAX_FILES
+def prune_profiles():
+    profiles = list_profiles()
+    for profile in profiles[PROFILE_MAX_FILES:]:
+        for extension in (".prof", ".txt"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile["id"] + extension))
+            except FileNotFoundError:
+                pass
+
+
+# Function to list stored profiles, newest first
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for filename in os.listdir(PROFILE_DIR):
+        if not filename.endswith(".prof"):
+            continue
+        path = os.path.join(PROFILE_DIR, filename)
+        profiles.append(
+            {
+                "id": filename[: -len(".prof")],
+                "size": os.path.getsize(path),
+                "created": os.path.getmtime(path),
+            }
+        )
+
+    return sorted(profiles, key=lambda p: p["id"], reverse=True)
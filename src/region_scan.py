@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Bulk wildfire scan of a region with the satellite CNN
+Enumerates the tiles covering a bounding box, fetches them concurrently
+under a rate limit, scores them in large batches and appends the results
+to a CSV file or Parquet dataset, checkpointing after every batch so an
+interrupted scan can be resumed
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from image_preprocessing import load_pixels
+from imagery_client import CircuitOpen
+from satellite_functions import satellite_cnn_predict_batch
+from tile_pack import (
+    TilePack,
+    directory_tile_source,
+    fetch_mapbox_tile,
+    tile_center,
+    tiles_in_bbox,
+)
+
+COLUMNS = ["z", "x", "y", "longitude", "latitude", "probability", "status"]
+
+
+# Blocking rate limiter shared by all fetch threads
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Function to get a fetch(z, x, y) -> uint8 pixels (or None) for a source
+def open_source(source):
+    if source.endswith(".npy"):
+        pack = TilePack(source)
+        return pack.get
+
+    fetch_tile = fetch_mapbox_tile if source == "mapbox" else directory_tile_source(source)
+
+    def fetch(z, x, y):
+        img = fetch_tile(z, x, y)
+        return None if img is None else load_pixels(img)
+
+    return fetch
+
+
+# Function to score one batch of fetched tiles into result rows
+def score_batch(tiles, pixel_arrays):
+    available = [i for i, pixels in enumerate(pixel_arrays) if pixels is not None]
+    probabilities = {}
+    if available:
+        scores = satellite_cnn_predict_batch([pixel_arrays[i] for i in available])
+        probabilities = dict(zip(available, scores))
+
+    rows = []
+    for i, (z, x, y) in enumerate(tiles):
+        longitude, latitude = tile_center(x, y, z)
+        probability = probabilities.get(i)
+        rows.append(
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "longitude": longitude,
+                "latitude": latitude,
+                "probability": None if probability is None else float(probability),
+                "status": "ok" if probability is not None else "missing",
+            }
+        )
+
+    return rows
+
+
+# Appends rows to a CSV file. The file size after each batch is recorded in
+# the checkpoint so a resumed scan can drop rows written after it.
+class CsvWriter:
+    def __init__(self, path, resume_offset):
+        exists = os.path.exists(path)
+        self.file = open(path, "r+" if exists else "w", newline="")
+        if exists:
+            self.file.truncate(resume_offset)
+            self.file.seek(resume_offset)
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def write(self, batch_number, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+# Writes one Parquet file per batch into a dataset directory, so rewriting
+# a batch after a resume simply replaces its part file
+class ParquetWriter:
+    def __init__(self, path, resume_offset):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, batch_number, rows):
+        part = os.path.join(self.path, f"part-{batch_number:06d}.parquet")
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(part, index=False)
+        return 0
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path, scan):
+    if not os.path.exists(path):
+        return {"scan": scan, "done": 0, "offset": 0}
+
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["scan"] != scan:
+        raise SystemExit(
+            f"Checkpoint '{path}' belongs to a different scan, remove it to start over."
+        )
+
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+# Function to scan a region, yielding progress after every batch
+def scan_region(
+    bbox, zoom, output, source="mapbox", batch_size=64, concurrency=8, rate_limit=10.0,
+    checkpoint_path=None,
+):
+    tiles = list(tiles_in_bbox(*bbox, zoom))
+    checkpoint_path = checkpoint_path or output + ".checkpoint.json"
+    scan = {"bbox": list(bbox), "zoom": zoom, "source": source, "batch_size": batch_size}
+    checkpoint = load_checkpoint(checkpoint_path, scan)
+
+    fetch = open_source(source)
+    limiter = RateLimiter(rate_limit)
+
+    def fetch_limited(tile):
+        limiter.acquire()
+        try:
+            return fetch(*tile)
+        except CircuitOpen:
+            # Stop rather than record every remaining tile as missing
+            raise
+        except Exception as e:
+            print(f"Failed to fetch tile {tile}: {e}")
+            return None
+
+    writer_class = ParquetWriter if output.endswith(".parquet") else CsvWriter
+    writer = writer_class(output, checkpoint["offset"])
+    batches = [
+        tiles[start : start + batch_size]
+        for start in range(checkpoint["done"], len(tiles), batch_size)
+    ]
+
+    try:
+        with ThreadPoolExecutor(concurrency) as executor:
+            # Fetch the next batch while the current one is being scored
+            pending = [executor.submit(fetch_limited, t) for t in batches[0]] if batches else []
+            for i, batch in enumerate(batches):
+                pixel_arrays = [future.result() for future in pending]
+                if i + 1 < len(batches):
+                    pending = [executor.submit(fetch_limited, t) for t in batches[i + 1]]
+
+                rows = score_batch(batch, pixel_arrays)
+                batch_number = checkpoint["done"] // batch_size
+                checkpoint["offset"] = writer.write(batch_number, rows)
+                checkpoint["done"] += len(batch)
+                save_checkpoint(checkpoint_path, checkpoint)
+
+                yield checkpoint["done"], len(tiles)
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--bbox",
+        nargs=4,
+        type=float,
+        required=True,
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+    )
+    parser.add_argument("--zoom", type=int, default=15)
+    parser.add_argument(
+        "--output", required=True, help="Results .csv file or .parquet dataset directory"
+    )
+    parser.add_argument(
+        "--source",
+        default="mapbox",
+        help="'mapbox', a tile pack (.npy) or a local z/x/y tile directory",
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--rate-limit", type=float, default=10.0, help="Maximum tile fetches per second"
+    )
+    parser.add_argument("--checkpoint", help="Defaults to OUTPUT.checkpoint.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        for done, total in scan_region(
+            args.bbox,
+            args.zoom,
+            args.output,
+            source=args.source,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            rate_limit=args.rate_limit,
+            checkpoint_path=args.checkpoint,
+        ):
+            elapsed = time.perf_counter() - start
+            print(f"{done}/{total} tiles scored ({elapsed:.1f}s)")
+    except CircuitOpen as e:
+        parser.exit(1, f"Stopped, the imagery provider is unavailable: {e}\nRe-run the same command to resume.\n")
+
+    print(f"Results written to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
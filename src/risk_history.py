@@ -0,0 +1,303 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from metrics import ERRORS, QUEUE_DEPTH
+
+# SQLite database with the risk scores computed by the web app and the
+# alert job, shared by all processes on the host
+RISK_HISTORY_DB = os.getenv("RISK_HISTORY_DB", "risk_history.db")
+# Set to false to stop recording; /risk_history keeps serving stored scores
+RISK_HISTORY_ENABLED = os.getenv("RISK_HISTORY_ENABLED", "true").lower() == "true"
+# Scores are grouped per grid cell of this many degrees (0.01 is about 1 km)
+RISK_HISTORY_GRID = float(os.getenv("RISK_HISTORY_GRID", "0.01"))
+# Days each resolution is kept for
+RETENTION_DAYS = {
+    "raw": int(os.getenv("RISK_HISTORY_RAW_DAYS", "7")),
+    "hourly": int(os.getenv("RISK_HISTORY_HOURLY_DAYS", "90")),
+    "daily": int(os.getenv("RISK_HISTORY_DAILY_DAYS", "1825")),
+}
+RETENTION_INTERVAL = 3600
+
+# Bucket width in seconds of each rollup table
+ROLLUPS = {"hourly": 3600, "daily": 86400}
+RESOLUTIONS = ["raw"] + list(ROLLUPS)
+MAX_POINTS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS risk_raw (
+    cell_lat INTEGER NOT NULL,
+    cell_lon INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    satellite REAL,
+    weather REAL NOT NULL,
+    average REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS risk_raw_cell_ts ON risk_raw (cell_lat, cell_lon, ts);
+CREATE INDEX IF NOT EXISTS risk_raw_ts ON risk_raw (ts);
+""" + "".join(
+    f"""
+CREATE TABLE IF NOT EXISTS risk_{name} (
+    cell_lat INTEGER NOT NULL,
+    cell_lon INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    average_sum REAL NOT NULL,
+    average_min REAL NOT NULL,
+    average_max REAL NOT NULL,
+    weather_sum REAL NOT NULL,
+    satellite_samples INTEGER NOT NULL,
+    satellite_sum REAL NOT NULL,
+    PRIMARY KEY (cell_lat, cell_lon, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS risk_{name}_bucket ON risk_{name} (bucket);
+"""
+    for name in ROLLUPS
+)
+
+# Merge a batch's aggregates into the existing rollup rows
+UPSERT = """
+INSERT INTO risk_{name} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (cell_lat, cell_lon, bucket) DO UPDATE SET
+    samples = samples + excluded.samples,
+    average_sum = average_sum + excluded.average_sum,
+    average_min = min(average_min, excluded.average_min),
+    average_max = max(average_max, excluded.average_max),
+    weather_sum = weather_sum + excluded.weather_sum,
+    satellite_samples = satellite_samples + excluded.satellite_samples,
+    satellite_sum = satellite_sum + excluded.satellite_sum
+"""
+
+
+_initialized = set()
+
+
+# Function to create the tables once per process. WAL mode persists in the
+# database file, so later connections, including reads, open plain.
+def init_schema(path):
+    if path in _initialized:
+        return
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+    _initialized.add(path)
+
+
+def connect(path):
+    init_schema(path)
+    return sqlite3.connect(path, timeout=30)
+
+
+# Function to map a location to its grid cell
+def cell(latitude, longitude):
+    return round(latitude / RISK_HISTORY_GRID), round(longitude / RISK_HISTORY_GRID)
+
+
+# Store of per-location risk scores. Scores are queued without blocking
+# the request and a background thread writes them in batches, one
+# transaction per batch, updating the hourly and daily rollups as it goes.
+class RiskHistory:
+    def __init__(self, path, batch_rows=500, flush_seconds=5.0, queue_size=10000):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    # Start the writer thread lazily, and again in a forked child process
+    def _ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self.thread = threading.Thread(target=self._run, name="risk-history", daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+            atexit.register(self.close)
+
+    # Function to queue one score, dropping it rather than waiting when full.
+    # satellite is None when the prediction fell back to the weather model.
+    def record(self, latitude, longitude, satellite, weather, average, source, timestamp=None):
+        self._ensure_started()
+        row = (
+            *cell(latitude, longitude),
+            time.time() if timestamp is None else timestamp,
+            source,
+            None if satellite is None else float(satellite),
+            float(weather),
+            float(average),
+        )
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            ERRORS.inc(stage="risk_history_dropped")
+            return
+        QUEUE_DEPTH.set(self.queue.qsize(), queue="risk_history")
+
+    # Function to write queued scores and stop the writer thread
+    def close(self, timeout=5.0):
+        if self.pid != os.getpid():
+            return
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.pid = None
+
+    def _run(self):
+        conn = connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        last_retention = 0.0
+        rows = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                row = ()
+
+            if row is None:
+                self._write_batch(conn, rows)
+                conn.close()
+                return
+            if row:
+                rows.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+
+            if len(rows) >= self.batch_rows or (rows and time.monotonic() >= deadline):
+                self._write_batch(conn, rows)
+                rows = []
+                deadline = None
+                QUEUE_DEPTH.set(self.queue.qsize(), queue="risk_history")
+
+                if time.monotonic() - last_retention >= RETENTION_INTERVAL:
+                    last_retention = time.monotonic()
+                    try:
+                        with conn:
+                            apply_retention(conn)
+                    except sqlite3.Error as e:
+                        ERRORS.inc(stage="risk_history")
+                        print(f"Error applying risk history retention: {e}")
+
+    def _write_batch(self, conn, rows):
+        if not rows:
+            return
+        try:
+            with conn:
+                write_batch(conn, rows)
+        except sqlite3.Error as e:
+            ERRORS.inc(stage="risk_history")
+            print(f"Error writing risk history: {e}")
+
+
+# Function to insert raw scores and merge them into the rollups; rows are
+# pre-aggregated per cell and bucket so each rollup row is updated once
+def write_batch(conn, rows):
+    conn.executemany("INSERT INTO risk_raw VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    for name, width in ROLLUPS.items():
+        buckets = defaultdict(lambda: [0, 0.0, 1.0, 0.0, 0.0, 0, 0.0])
+        for cell_lat, cell_lon, ts, _, satellite, weather, average in rows:
+            bucket = buckets[(cell_lat, cell_lon, int(ts // width) * width)]
+            bucket[0] += 1
+            bucket[1] += average
+            bucket[2] = min(bucket[2], average)
+            bucket[3] = max(bucket[3], average)
+            bucket[4] += weather
+            if satellite is not None:
+                bucket[5] += 1
+                bucket[6] += satellite
+        conn.executemany(
+            UPSERT.format(name=name), [key + tuple(values) for key, values in buckets.items()]
+        )
+
+
+# Function to delete scores older than each resolution's retention
+def apply_retention(conn, now=None):
+    now = time.time() if now is None else now
+    conn.execute("DELETE FROM risk_raw WHERE ts < ?", (now - RETENTION_DAYS["raw"] * 86400,))
+    for name in ROLLUPS:
+        conn.execute(
+            f"DELETE FROM risk_{name} WHERE bucket < ?", (now - RETENTION_DAYS[name] * 86400,)
+        )
+
+
+# Function to read the scores of a location between two unix times, as
+# probabilities (0-1) with the bucket or sample start time
+def query(latitude, longitude, start, end, resolution="hourly", path=RISK_HISTORY_DB):
+    cell_lat, cell_lon = cell(latitude, longitude)
+    conn = connect(path)
+    try:
+        if resolution == "raw":
+            rows = conn.execute(
+                "SELECT ts, 1, average, average, average, weather, satellite FROM risk_raw "
+                "WHERE cell_lat = ? AND cell_lon = ? AND ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+                (cell_lat, cell_lon, start, end, MAX_POINTS),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT bucket, samples, average_sum / samples, average_min, average_max, "
+                f"weather_sum / samples, "
+                f"CASE WHEN satellite_samples > 0 THEN satellite_sum / satellite_samples END "
+                f"FROM risk_{resolution} "
+                f"WHERE cell_lat = ? AND cell_lon = ? AND bucket >= ? AND bucket < ? "
+                f"ORDER BY bucket LIMIT ?",
+                (cell_lat, cell_lon, int(start // ROLLUPS[resolution]) * ROLLUPS[resolution],
+                 end, MAX_POINTS),
+            ).fetchall()
+    finally:
+        conn.close()
+
+    return [
+        {
+            "time": ts,
+            "samples": samples,
+            "average": average,
+            "average_min": average_min,
+            "average_max": average_max,
+            "weather": weather,
+            "satellite": satellite,
+        }
+        for ts, samples, average, average_min, average_max, weather, satellite in rows
+    ]
+
+
+# Function to summarise the daily average risk of a location over the past
+# `days` days, or None without at least two days of history
+def risk_trend(latitude, longitude, days=7, path=RISK_HISTORY_DB):
+    end = time.time()
+    try:
+        points = query(latitude, longitude, end - days * 86400, end, "daily", path)
+    except sqlite3.Error as e:
+        ERRORS.inc(stage="risk_history")
+        print(f"Error reading risk history: {e}")
+        return None
+    if len(points) < 2:
+        return None
+
+    values = [round(point["average"] * 100) for point in points]
+    change = values[-1] - values[0]
+    direction = "rising" if change >= 5 else "falling" if change <= -5 else "steady"
+
+    return {"days": days, "values": values, "change": change, "direction": direction}
+
+
+risk_history = None
+if RISK_HISTORY_ENABLED:
+    risk_history = RiskHistory(
+        RISK_HISTORY_DB,
+        batch_rows=int(os.getenv("RISK_HISTORY_BATCH_ROWS", "500")),
+        flush_seconds=float(os.getenv("RISK_HISTORY_FLUSH_SECONDS", "5")),
+    )
@@ -0,0 +1,74 @@
+import json
+import os
+
+# Host-specific inference settings written by autotune_runtime.py. Any value
+# can be overridden from the environment: TF_INTRA_OP_THREADS,
+# TF_INTER_OP_THREADS, BLAS_THREADS and <MODEL>_BATCH_CAP (e.g.
+# CAMERA_BATCH_CAP). 0 or unset keeps the library default.
+RUNTIME_PROFILE = os.getenv("RUNTIME_PROFILE", "runtime_profile.json")
+
+# Largest batch each model runs in one forward pass
+DEFAULT_BATCH_CAPS = {"camera": 32, "satellite": 32}
+
+_applied_pid = None
+
+
+def load_profile(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Function to resolve the runtime settings from the profile and environment
+def runtime_settings(path=RUNTIME_PROFILE):
+    profile = load_profile(path)
+    batch_caps = dict(DEFAULT_BATCH_CAPS)
+    batch_caps.update(profile.get("batch_caps", {}))
+
+    return {
+        "intra_op_threads": _env_int("TF_INTRA_OP_THREADS", profile.get("intra_op_threads", 0)),
+        "inter_op_threads": _env_int("TF_INTER_OP_THREADS", profile.get("inter_op_threads", 0)),
+        "blas_threads": _env_int("BLAS_THREADS", profile.get("blas_threads", 0)),
+        "batch_caps": {
+            model: _env_int(f"{model.upper()}_BATCH_CAP", cap) for model, cap in batch_caps.items()
+        },
+    }
+
+
+settings = runtime_settings()
+
+
+# Function to apply the thread settings in this process. TensorFlow only
+# accepts them before it runs its first operation, so this runs right
+# before the models are loaded (see model_loading.py).
+def apply_runtime_config():
+    global _applied_pid
+    if _applied_pid == os.getpid():
+        return
+    _applied_pid = os.getpid()
+
+    import tensorflow as tf
+
+    try:
+        if settings["intra_op_threads"]:
+            tf.config.threading.set_intra_op_parallelism_threads(settings["intra_op_threads"])
+        if settings["inter_op_threads"]:
+            tf.config.threading.set_inter_op_parallelism_threads(settings["inter_op_threads"])
+    except RuntimeError as e:
+        print(f"Warning: TensorFlow thread settings not applied: {e}")
+
+    if settings["blas_threads"]:
+        from threadpoolctl import threadpool_limits
+
+        threadpool_limits(limits=settings["blas_threads"])
+
+
+def batch_cap(model):
+    return settings["batch_caps"].get(model, DEFAULT_BATCH_CAPS.get(model, 32))
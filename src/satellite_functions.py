@@ -1,40 +1,89 @@
 import os
-from dotenv import load_dotenv
-import requests
 from PIL import Image
 from io import BytesIO
-import numpy as np
 from tensorflow.keras.models import load_model
 
-# Load environment variables from .env file
-load_dotenv()
-MAPBOX_TOKEN = os.getenv("MAPBOX_TOKEN")
+from image_preprocessing import preprocess_image, pixels_to_batch
+from tile_pack import TilePack, crop_to_view, lonlat_to_tile
+from imagery_client import ImageryUnavailable, imagery_client
+from metrics import STAGE_SECONDS, BATCH_SIZE, CACHE_REQUESTS
+from model_loading import register_model_loader
+from runtime_config import batch_cap
 
-model = load_model("analysis/wildfire_satellite_detection_model.keras")
+# Imagery provider: "mapbox" fetches live imagery, "pack" reads tiles from
+# the offline tile pack at SATELLITE_TILE_PACK
+SATELLITE_PROVIDER = os.getenv("SATELLITE_PROVIDER", "mapbox")
+SATELLITE_TILE_PACK = os.getenv("SATELLITE_TILE_PACK")
 
+tile_pack = None
+if SATELLITE_PROVIDER == "pack":
+    if not SATELLITE_TILE_PACK:
+        raise RuntimeError("SATELLITE_PROVIDER=pack requires SATELLITE_TILE_PACK, the path to a tile pack.")
+    tile_pack = TilePack(SATELLITE_TILE_PACK)
 
-# Function to preprocess the satellite image
-def preprocess_image(img_path):
-    img = Image.open(img_path)
-    img_resized = img.resize((224, 224))
-    img_array = np.array(img_resized)
-    img_array = img_array / 255.0
+model = None
 
-    return np.expand_dims(img_array, axis=0)
 
+def load_satellite_model():
+    global model
+    model = load_model("analysis/wildfire_satellite_detection_model.keras")
 
-# Function to predict wildfire probability using satellite imagery
+
+register_model_loader(load_satellite_model)
+
+
+# Function to predict wildfire probabilities for uint8 tiles of shape
+# (224, 224, 3), e.g. views into a tile pack
+def satellite_cnn_predict_batch(pixel_arrays):
+    with STAGE_SECONDS.time(stage="preprocess"):
+        batch = pixels_to_batch(pixel_arrays)
+    BATCH_SIZE.observe(len(batch), model="satellite")
+    with STAGE_SECONDS.time(stage="satellite_inference"):
+        predictions = model.predict(batch, batch_size=batch_cap("satellite"), verbose=0)
+
+    return predictions[:, 0]
+
+
+# Function to predict wildfire probability from the offline tile pack. The
+# tile containing the point is cropped to the field of view of the live
+# output_size image, so both providers score the same area.
+def satellite_pack_predict(latitude, longitude, output_size, zoom_level):
+    zoom = int(round(zoom_level))
+    x, y = lonlat_to_tile(longitude, latitude, zoom)
+    with STAGE_SECONDS.time(stage="tile_fetch"):
+        pixels = tile_pack.get(zoom, x, y)
+    if pixels is None:
+        CACHE_REQUESTS.inc(cache="tile_pack", result="miss")
+        raise ImageryUnavailable(f"Tile {zoom}/{x}/{y} is not in the tile pack.")
+    CACHE_REQUESTS.inc(cache="tile_pack", result="hit")
+
+    # The live image is rendered at the unrounded zoom
+    scale = 2 ** (zoom - zoom_level)
+    width, height = (size * scale for size in output_size)
+    with STAGE_SECONDS.time(stage="decode"):
+        pixels = crop_to_view(pixels, longitude, latitude, zoom, width, height)
+
+    return satellite_cnn_predict_batch([pixels])[0]
+
+
+# Function to predict wildfire probability using satellite imagery. Raises
+# ImageryUnavailable when no image can be fetched.
 def satellite_cnn_predict(
     latitude, longitude, output_size, zoom_level, crop_amount, save_path
 ):
+    if tile_pack is not None:
+        return satellite_pack_predict(latitude, longitude, output_size, zoom_level)
+
     # Increase the height of the image by crop_amount pixels
     output_size_modified = (output_size[0], output_size[1] + crop_amount)
 
-    url = f"https://api.mapbox.com/styles/v1/mapbox/satellite-v9/static/{longitude},{latitude},{zoom_level}/{output_size_modified[0]}x{output_size_modified[1]}?access_token={MAPBOX_TOKEN}"
-    response = requests.get(url)
+    with STAGE_SECONDS.time(stage="tile_fetch"):
+        image_bytes = imagery_client.static_image(
+            longitude, latitude, zoom_level, output_size_modified[0], output_size_modified[1]
+        )
 
-    if response.status_code == 200:
-        img = Image.open(BytesIO(response.content))
+    with STAGE_SECONDS.time(stage="decode"):
+        img = Image.open(BytesIO(image_bytes))
 
         # Calculate the amount of pixels to remove from top and bottom
         remove_pixels = crop_amount
@@ -44,13 +93,14 @@ def satellite_cnn_predict(
             (0, remove_pixels_half, img.width, img.height - remove_pixels_half)
         )
         img_resized = img_cropped.resize((224, 224))
-        img_resized.save(save_path)
-        print(f"Image saved as '{save_path}'")
+    img_resized.save(save_path)
+    print(f"Image saved as '{save_path}'")
 
-        processed_image = preprocess_image(save_path)
+    # Preprocess the in-memory image instead of re-reading the saved PNG
+    with STAGE_SECONDS.time(stage="preprocess"):
+        processed_image = preprocess_image(img_resized)
+    BATCH_SIZE.observe(1, model="satellite")
+    with STAGE_SECONDS.time(stage="satellite_inference"):
         prediction = model.predict(processed_image)
 
-        return prediction[0][0]
-
-    else:
-        print("Failed to retrieve the image.")
+    return prediction[0][0]
@@ -7,9 +7,15 @@ document.addEventListener("DOMContentLoaded", () => {
     const confidenceBar = document.getElementById('confidenceBar');
     const confidenceText = document.getElementById('confidenceText');
 
+    // Videos and MJPEG streams go through the frame-stream endpoint
+    const isStream = (file) =>
+        file.type.startsWith('video/') || /\.(mjpe?g)$/i.test(file.name);
+
     imageInput.addEventListener('change', () => {
         const file = imageInput.files[0];
-        if (file) {
+        if (file && isStream(file)) {
+            uploadedImage.style.display = 'none';
+        } else if (file) {
             const reader = new FileReader();
             reader.onload = (e) => {
                 uploadedImage.src = e.target.result;
@@ -27,8 +33,32 @@ document.addEventListener("DOMContentLoaded", () => {
             return;
         }
 
+        const file = imageInput.files[0];
+        if (isStream(file)) {
+            const formData = new FormData();
+            formData.append('stream', file);
+            formData.append('camera_id', file.name);
+
+            const response = await fetch('/camera_stream_predict', {
+                method: 'POST',
+                body: formData
+            });
+
+            const data = await response.json();
+            if (!response.ok) {
+                predictionResult.textContent = data.message;
+                return;
+            }
+
+            const risk = data.rolling_risk;
+            predictionResult.textContent = data.wildfire_prediction ? 'THERE IS A WILDFIRE' : 'THERE IS NO WILDFIRE';
+            confidenceBar.style.width = `${risk}%`;
+            confidenceText.textContent = `Rolling risk: ${risk}% (${data.scored_frames} of ${data.frames} frames scored)`;
+            return;
+        }
+
         const formData = new FormData();
-        formData.append('image', imageInput.files[0]);
+        formData.append('image', file);
 
         const response = await fetch('/camera_predict', {
             method: 'POST',
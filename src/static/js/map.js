@@ -121,12 +121,19 @@ document.addEventListener("DOMContentLoaded", () => {
         const satelliteConfidenceBar = document.getElementById('satelliteConfidenceBar');
         const satelliteConfidenceText = document.getElementById('satelliteConfidenceText');
 
-        satellitePredictionResult.textContent = satelliteStatus ? 'THERE IS A WILDFIRE (SATELLITE)' : 'THERE IS NO WILDFIRE (SATELLITE)';
-        satelliteConfidenceBar.style.width = `${satelliteProbability}%`;
         satelliteConfidenceBar.classList
             .remove('bg-red-500', 'bg-green-500');
-        satelliteConfidenceBar.classList.add(satelliteStatus ? 'bg-red-500' : 'bg-green-500');
-        satelliteConfidenceText.textContent = `Confidence: ${satelliteProbability}%`;
+        if (data.satellite_available === false) {
+            // The combined prediction falls back to the weather model
+            satellitePredictionResult.textContent = 'SATELLITE IMAGERY UNAVAILABLE';
+            satelliteConfidenceBar.style.width = '0%';
+            satelliteConfidenceText.textContent = 'Using the weather prediction only';
+        } else {
+            satellitePredictionResult.textContent = satelliteStatus ? 'THERE IS A WILDFIRE (SATELLITE)' : 'THERE IS NO WILDFIRE (SATELLITE)';
+            satelliteConfidenceBar.style.width = `${satelliteProbability}%`;
+            satelliteConfidenceBar.classList.add(satelliteStatus ? 'bg-red-500' : 'bg-green-500');
+            satelliteConfidenceText.textContent = `Confidence: ${satelliteProbability}%`;
+        }
 
         // Weather Prediction
         const weatherProbability = data.weather_probability;
@@ -155,5 +162,21 @@ document.addEventListener("DOMContentLoaded", () => {
         combinedConfidenceBar.classList.remove('bg-red-500', 'bg-green-500');
         combinedConfidenceBar.classList.add(averageStatus ? 'bg-red-500' : 'bg-green-500');
         combinedConfidenceText.textContent = `Confidence: ${averageProbability}%`;
+
+        showRiskTrend(center.lat, center.lng);
     });
+
+    // Show the daily combined risk stored for this location over the past week
+    async function showRiskTrend(lat, lng) {
+        const riskTrendText = document.getElementById('riskTrendText');
+        const response = await fetch(`/risk_history?latitude=${lat}&longitude=${lng}&resolution=daily`);
+        const data = await response.json();
+
+        if (!data.success || data.points.length < 2) {
+            riskTrendText.textContent = '';
+            return;
+        }
+        const values = data.points.map(point => `${point.average}%`);
+        riskTrendText.textContent = `Past ${values.length} days: ${values.join(' → ')}`;
+    }
 });
\ No newline at end of file
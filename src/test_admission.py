@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for admission control on the inference routes
+"""
+
+import threading
+import time
+
+import pytest
+
+from admission import BULK, INTERACTIVE, AdmissionController, ClientRateLimiter, Overloaded
+
+
+def test_full_queue_is_shed_with_retry_after():
+    controller = AdmissionController("test_full", max_concurrent=1, max_queue=0, max_wait=5)
+
+    with controller.admit():
+        with pytest.raises(Overloaded) as excinfo:
+            with controller.admit():
+                pass
+
+    assert excinfo.value.status == 503
+    assert excinfo.value.retry_after >= 1
+
+
+def test_request_that_cannot_meet_its_deadline_is_rejected_immediately():
+    controller = AdmissionController("test_deadline", max_concurrent=1, max_queue=10, max_wait=5)
+    controller.service_time = 2.0
+
+    with controller.admit():
+        start = time.monotonic()
+        with pytest.raises(Overloaded):
+            with controller.admit(deadline=0.5):
+                pass
+
+    assert time.monotonic() - start < 0.1
+
+
+def test_interactive_requests_start_before_queued_bulk_requests():
+    controller = AdmissionController("test_priority", max_concurrent=1, max_queue=10, max_wait=5)
+    controller.service_time = 0.01
+    started = []
+
+    def request(priority, label):
+        with controller.admit(priority):
+            started.append(label)
+
+    with controller.admit():
+        bulk = threading.Thread(target=request, args=(BULK, "bulk"))
+        bulk.start()
+        while not controller.waiting:
+            time.sleep(0.001)
+        interactive = threading.Thread(target=request, args=(INTERACTIVE, "interactive"))
+        interactive.start()
+        while len(controller.waiting) < 2:
+            time.sleep(0.001)
+
+    bulk.join()
+    interactive.join()
+
+    assert started == ["interactive", "bulk"]
+
+
+def test_client_rate_limit_returns_429_after_burst():
+    limiter = ClientRateLimiter(rate=1, burst=2)
+    limiter.check("test", "10.0.0.1")
+    limiter.check("test", "10.0.0.1")
+
+    with pytest.raises(Overloaded) as excinfo:
+        limiter.check("test", "10.0.0.1")
+    limiter.check("test", "10.0.0.2")
+
+    assert excinfo.value.status == 429
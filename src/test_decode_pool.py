@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the process pool decoding camera images into shared memory
+"""
+
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+import decode_pool
+from decode_pool import DecodePool
+from image_preprocessing import preprocess_image
+
+
+def make_jpeg(seed):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+SLOW_IMAGE = make_jpeg(99)
+
+
+# Runs in the forked workers: b"slow" decodes SLOW_IMAGE after a delay
+def slow_decode_into_slot(data, slot):
+    if data == b"slow":
+        time.sleep(0.5)
+        data = SLOW_IMAGE
+    return decode_into_slot(data, slot)
+
+
+decode_into_slot = decode_pool._decode_into_slot
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(decode_pool, "_decode_into_slot", slow_decode_into_slot)
+    pool = DecodePool(2, slots=4)
+    yield pool
+    pool.close()
+
+
+def test_batch_matches_preprocessing_in_process(pool):
+    blobs = [make_jpeg(seed) for seed in range(6)]
+
+    batch = pool.decode_many(blobs)
+
+    for blob, decoded in zip(blobs, batch):
+        expected = preprocess_image(Image.open(BytesIO(blob)))
+        np.testing.assert_allclose(decoded, expected[0])
+
+
+def test_corrupt_blob_frees_slots_only_after_other_tasks_finish(pool):
+    start = time.monotonic()
+    with pytest.raises(UnidentifiedImageError):
+        pool.decode_many([b"not an image", b"slow"])
+
+    # The slow task was still writing its slot when the corrupt blob failed
+    assert time.monotonic() - start >= 0.5
+    assert pool.free_slots.qsize() == pool.slots
+
+    blobs = [make_jpeg(seed) for seed in range(4)]
+    batch = pool.decode_many(blobs)
+    expected = preprocess_image(Image.open(BytesIO(blobs[0])))
+    np.testing.assert_allclose(batch[0], expected[0])
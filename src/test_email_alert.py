@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the hourly alert job, run as a script the way the web app's
+scheduler starts it, with its models, imagery, weather and mailer stubbed
+"""
+
+import os
+import runpy
+import sqlite3
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Installs the stubs, then runs email_alert.py as __main__
+JOB = """
+import os
+import runpy
+import sys
+
+import mailersend.emails
+import tensorflow.keras.models
+
+from benchmark_suite import StubMailer, StubModel, WeatherFixture, start_stub_mapbox
+
+server = start_stub_mapbox()
+os.environ["MAPBOX_API_URL"] = f"http://127.0.0.1:{server.server_port}"
+tensorflow.keras.models.load_model = lambda *args, **kwargs: StubModel()
+mailersend.emails.NewEmail = StubMailer
+
+import meteorological_functions
+
+fixture = WeatherFixture()
+meteorological_functions.fetch_weather_data = lambda latitude, longitude: fixture
+
+sys.argv = ["email_alert.py"]
+runpy.run_path(os.path.join(os.environ["PYTHONPATH"], "email_alert.py"), run_name="__main__")
+print("emails sent:", StubMailer.sent)
+print("weather model:", type(meteorological_functions.model).__name__)
+"""
+
+
+def gunicorn_env():
+    raw_env = runpy.run_path(os.path.join(SRC_DIR, "gunicorn.conf.py"))["raw_env"]
+    return dict(item.split("=", 1) for item in raw_env)
+
+
+def test_alert_job_loads_its_models_under_gunicorn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "alerts.db")
+    conn.execute("CREATE TABLE alerts (email TEXT, latitude REAL, longitude REAL)")
+    conn.executemany(
+        "INSERT INTO alerts VALUES (?, ?, ?)",
+        [("a@example.com", 37.77, -122.42), ("b@example.com", 37.78, -122.42)],
+    )
+    conn.commit()
+    conn.close()
+
+    env = dict(
+        os.environ,
+        **gunicorn_env(),
+        PYTHONPATH=SRC_DIR,
+        MAPBOX_TOKEN="stub",
+        RISK_HISTORY_ENABLED="false",
+        FEATURE_LOG_ENABLED="false",
+        ALERT_METRICS_PATH=str(tmp_path / "alert_metrics.json"),
+        ALERT_JOB_LOCK_PATH=str(tmp_path / "alert_job.lock"),
+    )
+    assert env["DEFER_MODEL_LOADING"] == "true"
+
+    result = subprocess.run(
+        [sys.executable, "-c", JOB],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "emails sent: 2" in result.stdout
+    assert "weather model: StubModel" in result.stdout
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the served-feature log: segment rotation, size bounding, dropped
+rows and reading segments back
+"""
+
+import os
+import time
+
+import numpy as np
+
+from feature_log import (
+    LOG_COLUMNS,
+    FeatureLog,
+    enforce_size_limit,
+    list_segments,
+    read_segments,
+    segment_time,
+)
+from metrics import ERRORS
+
+
+def make_row(i):
+    return {column: float(i) for column in LOG_COLUMNS}
+
+
+def write_rows(directory, count, **kwargs):
+    log = FeatureLog(str(directory), **kwargs)
+    for i in range(count):
+        log.log(make_row(i))
+    log.close()
+
+
+def test_segments_rotate_every_segment_rows(tmp_path):
+    write_rows(tmp_path, 25, segment_rows=10)
+
+    segments = list(read_segments(str(tmp_path)))
+
+    assert [len(columns["FWI"]) for _, columns in segments] == [10, 10, 5]
+    fwi = np.concatenate([columns["FWI"] for _, columns in segments])
+    assert fwi.tolist() == list(range(25))
+
+
+def test_oldest_segments_are_deleted_above_max_bytes(tmp_path):
+    write_rows(tmp_path, 40, segment_rows=10)
+    segments = list_segments(str(tmp_path))
+    newest_size = os.path.getsize(tmp_path / segments[-1])
+
+    enforce_size_limit(str(tmp_path), newest_size)
+
+    assert list_segments(str(tmp_path)) == segments[-1:]
+
+
+def test_rows_are_dropped_when_the_queue_is_full(tmp_path):
+    log = FeatureLog(str(tmp_path), queue_size=1)
+    # Pretend the writer thread is running but stalled
+    log.pid = os.getpid()
+    dropped = ERRORS.values.get(("feature_log_dropped",), 0)
+
+    log.log(make_row(0))
+    log.log(make_row(1))
+
+    assert ERRORS.values[("feature_log_dropped",)] == dropped + 1
+    assert log.queue.qsize() == 1
+
+
+def test_late_published_segment_is_still_read(tmp_path):
+    write_rows(tmp_path, 5)
+    consumed = {name for name, _ in read_segments(str(tmp_path))}
+
+    # Another process named its segment earlier but published it later
+    late = f"segment-{time.time_ns() - 10**9:020d}-1.npz"
+    with open(tmp_path / late, "wb") as f:
+        np.savez_compressed(f, **{column: np.zeros(3) for column in LOG_COLUMNS})
+
+    assert [name for name, _ in read_segments(str(tmp_path), skip=consumed)] == [late]
+    assert not list(read_segments(str(tmp_path), written_before=segment_time(late) - 1))
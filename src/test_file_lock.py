@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for the file lock electing the process that runs the alert job
+"""
+
+import multiprocessing
+
+from file_lock import FileLock
+
+
+def try_acquire_in_child(path, results):
+    results.put(FileLock(path).try_acquire())
+
+
+def acquire_from_other_process(path):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=try_acquire_in_child, args=(path, results))
+    process.start()
+    process.join()
+    return results.get()
+
+
+def test_only_one_process_holds_the_lock(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    lock = FileLock(path)
+
+    assert lock.try_acquire()
+    assert lock.try_acquire()
+    assert not acquire_from_other_process(path)
+
+    lock.release()
+    assert acquire_from_other_process(path)
+
+
+def test_forked_child_does_not_inherit_the_lock(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    lock = FileLock(path)
+    lock.try_acquire()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=lambda: results.put(lock.held()))
+    process.start()
+    process.join()
+
+    assert results.get() is False
+    lock.release()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the shared float32 image preprocessing
+Compares against the float64 pipeline previously used by both CNNs
+"""
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import preprocess_image, preprocess_batch, preprocess_file
+
+
+def legacy_preprocess_image(img):
+    """The original camera/satellite preprocessing"""
+    img_resized = img.resize((224, 224))
+    img_array = np.array(img_resized)
+    img_array = img_array / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def random_image(mode, size=(350, 315), seed=0):
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    pixels = rng.integers(0, 256, size=(size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(pixels, mode)
+
+
+def test_camera_parity():
+    """RGB images match the legacy output within float32 precision"""
+    img = random_image("RGB")
+    expected = legacy_preprocess_image(img)
+    result = preprocess_image(img)
+
+    assert result.dtype == np.float32
+    assert result.shape == expected.shape == (1, 224, 224, 3)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-7)
+
+
+def test_satellite_parity(tmp_path):
+    """Satellite tiles read from disk match the legacy output"""
+    path = tmp_path / "satellite_image.png"
+    random_image("RGB", size=(224, 224), seed=1).save(path)
+
+    expected = legacy_preprocess_image(Image.open(path))
+    result = preprocess_file(path)
+
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-7)
+
+
+def test_rgba_is_converted_to_rgb():
+    """RGBA tiles are reduced to the three channels the model expects"""
+    img = random_image("RGBA", seed=2)
+    expected = legacy_preprocess_image(img.convert("RGB"))
+    result = preprocess_image(img)
+
+    assert result.shape == (1, 224, 224, 3)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-7)
+
+
+def test_batch_matches_single():
+    """A batch is the concatenation of single-image results"""
+    images = [random_image("RGB", seed=seed) for seed in range(4)]
+    singles = [preprocess_image(img).copy() for img in images]
+    batch = preprocess_batch(images)
+
+    assert batch.shape == (4, 224, 224, 3)
+    for i, single in enumerate(singles):
+        np.testing.assert_array_equal(batch[i], single[0])
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for the imagery client and its circuit breaker
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import imagery_client
+from imagery_client import CircuitBreaker, CircuitOpen, ImageryClient, ImageryUnavailable
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    """Answers every request with the server's current status code"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.server.ports.add(self.client_address[1])
+        body = b"image" if self.server.status == 200 else b"error"
+        self.send_response(self.server.status)
+        if self.server.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def provider():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubProvider)
+    server.status = 200
+    server.retry_after = None
+    server.requests = 0
+    server.ports = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, failures=3, reset_seconds=30):
+    return ImageryClient(
+        f"http://127.0.0.1:{server.server_port}",
+        "token",
+        CircuitBreaker("test", failures, reset_seconds),
+    )
+
+
+def test_requests_reuse_pooled_connections(provider):
+    client = make_client(provider)
+
+    for _ in range(5):
+        assert client.tile(15, 1, 2) == b"image"
+
+    assert provider.ports and len(provider.ports) == 1
+
+
+def test_server_errors_are_retried_then_raised(provider, monkeypatch):
+    monkeypatch.setattr(imagery_client, "IMAGERY_RETRIES", 2)
+    provider.status = 503
+    client = make_client(provider)
+
+    with pytest.raises(ImageryUnavailable):
+        client.tile(15, 1, 2)
+
+    assert provider.requests == 3
+
+
+def test_retry_after_does_not_stall_retries(provider, monkeypatch):
+    monkeypatch.setattr(imagery_client, "IMAGERY_RETRIES", 2)
+    provider.status = 429
+    provider.retry_after = 30
+    client = make_client(provider)
+
+    start = time.monotonic()
+    with pytest.raises(ImageryUnavailable):
+        client.tile(15, 1, 2)
+
+    assert time.monotonic() - start < 5
+    assert provider.requests == 3
+
+
+def test_circuit_opens_and_fails_fast(provider, monkeypatch):
+    monkeypatch.setattr(imagery_client, "IMAGERY_RETRIES", 0)
+    provider.status = 500
+    client = make_client(provider, failures=3)
+
+    for _ in range(3):
+        with pytest.raises(ImageryUnavailable):
+            client.tile(15, 1, 2)
+    with pytest.raises(CircuitOpen):
+        client.tile(15, 1, 2)
+
+    assert provider.requests == 3
+
+
+def test_half_open_trial_closes_the_circuit(provider, monkeypatch):
+    monkeypatch.setattr(imagery_client, "IMAGERY_RETRIES", 0)
+    provider.status = 500
+    client = make_client(provider, failures=1, reset_seconds=0)
+
+    with pytest.raises(ImageryUnavailable):
+        client.tile(15, 1, 2)
+    provider.status = 200
+
+    assert client.tile(15, 1, 2) == b"image"
+    assert client.breaker.opened_at is None
+
+
+def test_not_found_does_not_open_the_circuit(provider, monkeypatch):
+    monkeypatch.setattr(imagery_client, "IMAGERY_RETRIES", 0)
+    provider.status = 404
+    client = make_client(provider, failures=1)
+
+    for _ in range(3):
+        with pytest.raises(ImageryUnavailable) as excinfo:
+            client.tile(15, 1, 2)
+        assert not isinstance(excinfo.value, CircuitOpen)
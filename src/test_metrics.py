@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus-style metrics layer
+"""
+
+import metrics
+from metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    load_snapshot,
+    merge_snapshot,
+    registry,
+    render_metrics,
+    save_snapshot,
+)
+
+
+def make_metrics(suffix):
+    metrics = (
+        Counter(f"test_requests_{suffix}_total", "Requests.", ["route"]),
+        Gauge(f"test_depth_{suffix}", "Depth."),
+        Histogram(f"test_seconds_{suffix}", "Latency.", buckets=(0.1, 1.0)),
+    )
+    return metrics
+
+
+def remove(metrics):
+    for metric in metrics:
+        registry.remove(metric)
+
+
+def test_histogram_buckets_are_cumulative():
+    counter, gauge, histogram = metrics = make_metrics("render")
+    try:
+        counter.inc(route="/camera_predict")
+        gauge.set(3)
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        lines = render_metrics().splitlines()
+    finally:
+        remove(metrics)
+
+    assert 'test_requests_render_total{process="web",route="/camera_predict"} 1' in lines
+    assert 'test_depth_render{process="web"} 3' in lines
+    assert 'test_seconds_render_bucket{process="web",le="0.1"} 1' in lines
+    assert 'test_seconds_render_bucket{process="web",le="1"} 2' in lines
+    assert 'test_seconds_render_bucket{process="web",le="+Inf"} 3' in lines
+    assert 'test_seconds_render_count{process="web"} 3' in lines
+
+
+def test_job_snapshots_accumulate_across_runs(tmp_path, monkeypatch):
+    # merge_snapshot folds into the whole registry, so run against a registry
+    # holding only this test's metrics
+    monkeypatch.setattr(metrics, "registry", [])
+    counter, gauge, histogram = make_metrics("merge")
+    path = str(tmp_path / "alert_metrics.json")
+
+    counter.inc(2, route="job")
+    gauge.set(7)
+    histogram.observe(0.5)
+    save_snapshot(path)
+
+    # A new run starts from the previous run's snapshot
+    for metric in (counter, gauge, histogram):
+        metric.values.clear()
+    merge_snapshot(load_snapshot(path))
+    assert gauge.values[()] == 7
+    counter.inc(route="job")
+    gauge.set(1)
+    histogram.observe(0.05)
+
+    lines = render_metrics(process="alert_job").splitlines()
+
+    assert 'test_requests_merge_total{process="alert_job",route="job"} 3' in lines
+    assert 'test_depth_merge{process="alert_job"} 1' in lines
+    assert 'test_seconds_merge_count{process="alert_job"} 2' in lines
+    assert 'test_seconds_merge_bucket{process="alert_job",le="0.1"} 1' in lines
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for checkpointing and resuming bulk region scans, using a local
+tile directory and a stub model
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+import model_loading
+from tile_pack import tiles_in_bbox
+
+BBOX = (-122.45, 37.72, -122.40, 37.76)
+ZOOM = 15
+BATCH_SIZE = 4
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def tile_dir(tmp_path):
+    root = tmp_path / "tiles"
+    for i, (z, x, y) in enumerate(tiles_in_bbox(*BBOX, ZOOM)):
+        # Leave a few tiles out so missing tiles are covered too
+        if i % 5 == 3:
+            continue
+        path = root / str(z) / str(x) / f"{y}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pixels = np.full((64, 64, 3), (x + y) % 256, dtype=np.uint8)
+        Image.fromarray(pixels).save(path)
+    return str(root)
+
+
+def stub_predict(pixel_arrays):
+    return [round(float(pixels.mean()) / 255, 2) for pixels in pixel_arrays]
+
+
+# Scores with more digits, so rows rewritten after a resume are shorter than
+# the ones the interrupted run left behind
+def long_stub_predict(pixel_arrays):
+    return [float(pixels.mean()) / 255 + 1e-9 for pixels in pixel_arrays]
+
+
+@pytest.fixture
+def region_scan(monkeypatch):
+    # The scan's model is stubbed, so skip loading the real one on import
+    monkeypatch.setattr(model_loading, "DEFER_MODEL_LOADING", True)
+    import region_scan
+
+    monkeypatch.setattr(region_scan, "satellite_cnn_predict_batch", stub_predict)
+    return region_scan
+
+
+def run_scan(region_scan, tile_dir, output, **kwargs):
+    for _ in region_scan.scan_region(
+        BBOX, ZOOM, output, source=tile_dir, batch_size=BATCH_SIZE, rate_limit=0, **kwargs
+    ):
+        pass
+
+
+def crash_before_checkpoint(region_scan, monkeypatch, batch):
+    """Fail after `batch` batches were written but before the last was checkpointed"""
+    save_checkpoint = region_scan.save_checkpoint
+    calls = []
+
+    def save_or_crash(path, checkpoint):
+        calls.append(path)
+        if len(calls) == batch:
+            raise Crash()
+        save_checkpoint(path, checkpoint)
+
+    monkeypatch.setattr(region_scan, "save_checkpoint", save_or_crash)
+
+
+def test_resumed_csv_scan_has_no_duplicate_or_missing_rows(
+    region_scan, tile_dir, tmp_path, monkeypatch
+):
+    expected_path = str(tmp_path / "expected.csv")
+    run_scan(region_scan, tile_dir, expected_path)
+    expected = pd.read_csv(expected_path)
+    assert len(expected) > 3 * BATCH_SIZE
+    assert (expected["status"] == "missing").any()
+
+    # Crash on the last batch: the rewritten rows are then all that follows
+    # the checkpoint, so stale bytes are only removed by truncating
+    batches = -(-len(expected) // BATCH_SIZE)
+    output = str(tmp_path / "scan.csv")
+    with monkeypatch.context() as patch:
+        crash_before_checkpoint(region_scan, patch, batches)
+        patch.setattr(region_scan, "satellite_cnn_predict_batch", long_stub_predict)
+        with pytest.raises(Crash):
+            run_scan(region_scan, tile_dir, output)
+    # The last batch reached the file but not the checkpoint
+    assert len(pd.read_csv(output)) == len(expected)
+
+    run_scan(region_scan, tile_dir, output)
+
+    result = pd.read_csv(output)
+    keys = ["z", "x", "y", "status"]
+    pd.testing.assert_frame_equal(result[keys], expected[keys])
+    # Rows after the last checkpoint were rewritten by the resumed run
+    checkpointed = (batches - 1) * BATCH_SIZE
+    pd.testing.assert_frame_equal(result.iloc[checkpointed:], expected.iloc[checkpointed:])
+
+
+def test_resumed_parquet_scan_replaces_the_interrupted_part(
+    region_scan, tile_dir, tmp_path, monkeypatch
+):
+    pytest.importorskip("pyarrow")
+    expected_path = str(tmp_path / "expected.parquet")
+    run_scan(region_scan, tile_dir, expected_path)
+
+    output = str(tmp_path / "scan.parquet")
+    with monkeypatch.context() as patch:
+        crash_before_checkpoint(region_scan, patch, 2)
+        with pytest.raises(Crash):
+            run_scan(region_scan, tile_dir, output)
+    run_scan(region_scan, tile_dir, output)
+
+    result = pd.read_parquet(output).sort_values(["y", "x"], ignore_index=True)
+    expected = pd.read_parquet(expected_path).sort_values(["y", "x"], ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_checkpoint_of_another_scan_is_refused(region_scan, tile_dir, tmp_path):
+    output = str(tmp_path / "scan.csv")
+    run_scan(region_scan, tile_dir, output)
+
+    with pytest.raises(SystemExit, match="different scan"):
+        for _ in region_scan.scan_region(
+            BBOX, ZOOM + 1, output, source=tile_dir, batch_size=BATCH_SIZE, rate_limit=0
+        ):
+            pass
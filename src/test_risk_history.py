@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the risk time-series store, its rollups and retention
+"""
+
+import time
+
+import pytest
+
+from risk_history import RiskHistory, apply_retention, connect, query, risk_trend, write_batch
+
+# Start of yesterday (UTC), within every retention period
+DAY = (int(time.time()) // 86400 - 1) * 86400
+LATITUDE, LONGITUDE = 38.58, -121.49
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "risk_history.db")
+
+
+def record_all(path, scores):
+    store = RiskHistory(path, batch_rows=2, flush_seconds=0.01)
+    for timestamp, satellite, weather, average in scores:
+        store.record(LATITUDE, LONGITUDE, satellite, weather, average, "web", timestamp=timestamp)
+    store.close()
+
+
+def test_rollups_aggregate_each_bucket(path):
+    record_all(path, [
+        (DAY + 60, 0.8, 0.4, 0.6),
+        (DAY + 120, None, 0.2, 0.2),
+        (DAY + 3700, 0.9, 0.5, 0.7),
+    ])
+
+    raw = query(LATITUDE, LONGITUDE, DAY, DAY + 86400, "raw", path)
+    hourly = query(LATITUDE, LONGITUDE, DAY, DAY + 86400, "hourly", path)
+    daily = query(LATITUDE, LONGITUDE, DAY, DAY + 86400, "daily", path)
+
+    assert [point["time"] for point in raw] == [DAY + 60, DAY + 120, DAY + 3700]
+    assert [point["time"] for point in hourly] == [DAY, DAY + 3600]
+    first = hourly[0]
+    assert first["samples"] == 2
+    assert first["average"] == pytest.approx(0.4)
+    assert (first["average_min"], first["average_max"]) == (0.2, 0.6)
+    assert first["weather"] == pytest.approx(0.3)
+    assert first["satellite"] == pytest.approx(0.8)
+    assert daily[0]["samples"] == 3
+    assert daily[0]["average"] == pytest.approx(0.5)
+
+
+def test_nearby_locations_share_a_cell(path):
+    record_all(path, [(DAY, 0.5, 0.5, 0.5)])
+
+    assert query(LATITUDE + 0.001, LONGITUDE - 0.001, DAY, DAY + 1, "raw", path)
+    assert not query(LATITUDE + 0.1, LONGITUDE, DAY, DAY + 1, "raw", path)
+
+
+def test_retention_keeps_rollups_longer_than_raw_scores(path):
+    conn = connect(path)
+    with conn:
+        write_batch(conn, [(3858, -12149, DAY, "alert", None, 0.3, 0.3)])
+        apply_retention(conn, now=DAY + 30 * 86400)
+    conn.close()
+
+    assert not query(LATITUDE, LONGITUDE, DAY, DAY + 86400, "raw", path)
+    assert query(LATITUDE, LONGITUDE, DAY, DAY + 86400, "hourly", path)
+
+
+def test_trend_compares_the_first_and_last_day(path):
+    now = time.time()
+    record_all(path, [
+        (now - 3 * 86400, None, 0.2, 0.2),
+        (now - 2 * 86400, None, 0.3, 0.3),
+        (now - 60, None, 0.5, 0.5),
+    ])
+
+    trend = risk_trend(LATITUDE, LONGITUDE, path=path)
+
+    assert trend["values"] == [20, 30, 50]
+    assert trend["direction"] == "rising"
+    assert risk_trend(LATITUDE + 1, LONGITUDE, path=path) is None
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Tests for resolving the runtime profile and its environment overrides
+"""
+
+import json
+
+from runtime_config import DEFAULT_BATCH_CAPS, runtime_settings
+
+
+def test_missing_profile_keeps_library_defaults(tmp_path):
+    settings = runtime_settings(str(tmp_path / "missing.json"))
+
+    assert settings["intra_op_threads"] == 0
+    assert settings["inter_op_threads"] == 0
+    assert settings["blas_threads"] == 0
+    assert settings["batch_caps"] == DEFAULT_BATCH_CAPS
+
+
+def test_environment_overrides_the_profile(tmp_path, monkeypatch):
+    path = tmp_path / "runtime_profile.json"
+    path.write_text(json.dumps({
+        "intra_op_threads": 4,
+        "inter_op_threads": 2,
+        "blas_threads": 4,
+        "batch_caps": {"camera": 16},
+    }))
+    monkeypatch.setenv("TF_INTRA_OP_THREADS", "2")
+    monkeypatch.setenv("SATELLITE_BATCH_CAP", "8")
+
+    settings = runtime_settings(str(path))
+
+    assert settings["intra_op_threads"] == 2
+    assert settings["inter_op_threads"] == 2
+    assert settings["blas_threads"] == 4
+    assert settings["batch_caps"] == {"camera": 16, "satellite": 8}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for offline satellite tile packs
+"""
+
+import numpy as np
+from PIL import Image
+
+from tile_pack import (
+    TilePack,
+    build_tile_pack,
+    crop_to_view,
+    lonlat_to_tile,
+    tile_center,
+    tile_to_lonlat,
+    tiles_in_bbox,
+)
+
+
+def synthetic_tile(z, x, y):
+    """Deterministic 256x256 RGBA tile, like a raster tile server returns"""
+    rng = np.random.default_rng(x * 1000 + y)
+    pixels = rng.integers(0, 256, size=(256, 256, 4), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGBA")
+
+
+def test_tile_geometry_round_trip():
+    x, y = lonlat_to_tile(-122.4194, 37.7749, 15)
+    longitude, latitude = tile_center(x, y, 15)
+
+    assert lonlat_to_tile(longitude, latitude, 15) == (x, y)
+
+
+def test_bbox_covers_corners():
+    tiles = list(tiles_in_bbox(-122.5, 37.7, -122.4, 37.8, 14))
+    xs = {x for _, x, _ in tiles}
+    ys = {y for _, _, y in tiles}
+
+    assert (14,) + lonlat_to_tile(-122.5, 37.8, 14) in tiles
+    assert (14,) + lonlat_to_tile(-122.4, 37.7, 14) in tiles
+    assert len(tiles) == len(xs) * len(ys)
+
+
+def test_pack_round_trip_is_zero_copy(tmp_path):
+    path = str(tmp_path / "region.npy")
+    tiles = list(tiles_in_bbox(-122.5, 37.7, -122.4, 37.8, 14))[::-1]
+
+    def fetch_tile(z, x, y):
+        # One tile is unavailable from the source
+        return None if (z, x, y) == tiles[0] else synthetic_tile(z, x, y)
+
+    assert build_tile_pack(path, tiles, fetch_tile, workers=2) == len(tiles) - 1
+
+    pack = TilePack(path)
+    assert len(pack) == len(tiles) - 1
+    assert pack.get(*tiles[0]) is None
+
+    for tile in tiles[1:]:
+        pixels = pack.get(*tile)
+        expected = np.asarray(synthetic_tile(*tile).convert("RGB").resize((224, 224)))
+        assert np.shares_memory(pixels, pack.tiles)
+        np.testing.assert_array_equal(pixels, expected)
+
+
+def test_crop_matches_static_image_view():
+    x, y = lonlat_to_tile(-122.4194, 37.7749, 15)
+    # A point at pixel (134.4, 134.4) of the 224 px tile
+    longitude, latitude = tile_to_lonlat(x + 0.6, y + 0.6, 15)
+    pixels = np.asarray(synthetic_tile(15, x, y).convert("RGB").resize((224, 224)))
+
+    view = crop_to_view(pixels, longitude, latitude, 15, 350, 350)
+
+    # A 350 px static image covers 350 / 512 of a tile: 153 of 224 pixels
+    expected = Image.fromarray(pixels[58:211, 58:211]).resize((224, 224))
+    assert view.shape == pixels.shape
+    np.testing.assert_array_equal(view, np.asarray(expected))
+
+
+def test_crop_near_tile_edge_stays_inside_tile():
+    x, y = lonlat_to_tile(-122.4194, 37.7749, 15)
+    longitude, latitude = tile_to_lonlat(x, y, 15)
+    pixels = np.asarray(synthetic_tile(15, x, y).convert("RGB").resize((224, 224)))
+
+    view = crop_to_view(pixels, longitude + 1e-7, latitude - 1e-7, 15, 350, 350)
+
+    expected = Image.fromarray(pixels[:153, :153]).resize((224, 224))
+    np.testing.assert_array_equal(view, np.asarray(expected))
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
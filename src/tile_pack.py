@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Offline satellite tile packs
+A pack is a memory-mapped .npy file of preprocessed 224x224 RGB uint8 tiles
+plus a sorted (z, x, y) index, so tiles can be read zero-copy at disk speed
+"""
+
+import argparse
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import IMAGE_SIZE, CHANNELS, load_pixels
+from imagery_client import CircuitOpen, ImageryUnavailable, imagery_client
+
+TILE_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], CHANNELS)
+
+
+# Web Mercator (slippy map) tile helpers
+
+
+# Function to get a point's position in tile units; the integer parts are
+# the tile containing it and the fractions its position inside that tile
+def lonlat_to_tile_position(longitude, latitude, zoom):
+    n = 2**zoom
+    lat_rad = math.radians(latitude)
+    x = (longitude + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+
+    return x, y
+
+
+# Function to find the tile containing a point
+def lonlat_to_tile(longitude, latitude, zoom):
+    n = 2**zoom
+    x, y = lonlat_to_tile_position(longitude, latitude, zoom)
+
+    return min(max(int(x), 0), n - 1), min(max(int(y), 0), n - 1)
+
+
+# Function to get the north-west corner of a tile
+def tile_to_lonlat(x, y, zoom):
+    n = 2**zoom
+    longitude = x / n * 360.0 - 180.0
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+    return longitude, latitude
+
+
+# Function to get the centre of a tile
+def tile_center(x, y, zoom):
+    west, north = tile_to_lonlat(x, y, zoom)
+    east, south = tile_to_lonlat(x + 1, y + 1, zoom)
+
+    return (west + east) / 2, (north + south) / 2
+
+
+# Function to enumerate the tiles covering a bounding box, row by row
+def tiles_in_bbox(min_lon, min_lat, max_lon, max_lat, zoom):
+    x_min, y_min = lonlat_to_tile(min_lon, max_lat, zoom)
+    x_max, y_max = lonlat_to_tile(max_lon, min_lat, zoom)
+    for y in range(y_min, y_max + 1):
+        for x in range(x_min, x_max + 1):
+            yield zoom, x, y
+
+
+# Tile keys are packed into one sortable int64: 5 bits z, 29 bits x, 29 bits y
+def pack_key(z, x, y):
+    return (int(z) << 58) | (int(x) << 29) | int(y)
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".index.npy"
+
+
+# Writes tiles into a new pack. Tiles are stored in insertion order and the
+# index is sorted when the pack is closed.
+class TilePackBuilder:
+    def __init__(self, path, capacity):
+        self.path = path
+        self.tiles = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.uint8, shape=(capacity,) + TILE_SHAPE
+        )
+        self.keys = []
+
+    def add(self, z, x, y, img):
+        slot = len(self.keys)
+        if slot >= len(self.tiles):
+            raise ValueError("Tile pack is full.")
+        self.tiles[slot] = load_pixels(img)
+        self.keys.append(pack_key(z, x, y))
+
+    def close(self):
+        self.tiles.flush()
+        keys = np.array(self.keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        index = np.empty(len(keys), dtype=[("key", np.int64), ("slot", np.int64)])
+        index["key"] = keys[order]
+        index["slot"] = order
+        np.save(index_path(self.path), index)
+        del self.tiles
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Read-only view of a tile pack. Returned tiles are views into the
+# memory-mapped file, nothing is copied until the caller scales them.
+class TilePack:
+    def __init__(self, path):
+        self.path = path
+        self.tiles = np.load(path, mmap_mode="r")
+        index = np.load(index_path(path), mmap_mode="r")
+        self.keys = index["key"]
+        self.slots = index["slot"]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def slot(self, z, x, y):
+        key = pack_key(z, x, y)
+        i = np.searchsorted(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return int(self.slots[i])
+
+        return None
+
+    def __contains__(self, tile):
+        return self.slot(*tile) is not None
+
+    # Function to get a (224, 224, 3) uint8 view of a tile, or None if missing
+    def get(self, z, x, y):
+        slot = self.slot(z, x, y)
+        if slot is None:
+            return None
+
+        return self.tiles[slot]
+
+    def get_many(self, tiles):
+        return [self.get(*tile) for tile in tiles]
+
+
+# Function to crop a packed tile to the view of a width x height image
+# centred on a point, as the Mapbox Static Images API renders it at the
+# tile's zoom with 512 px tiles, and resize it back to the tile shape. A
+# view reaching past the tile is shifted to stay inside it.
+def crop_to_view(pixels, longitude, latitude, zoom, width, height, static_tile_size=512):
+    tile_height, tile_width = pixels.shape[:2]
+    x, y = lonlat_to_tile_position(longitude, latitude, zoom)
+
+    def window(position, view_size, tile_size):
+        size = max(1, min(tile_size, round(tile_size * view_size / static_tile_size)))
+        start = round((position - math.floor(position)) * tile_size - size / 2)
+        return min(max(start, 0), tile_size - size), size
+
+    left, crop_width = window(x, width, tile_width)
+    top, crop_height = window(y, height, tile_height)
+    crop = pixels[top : top + crop_height, left : left + crop_width]
+
+    return load_pixels(Image.fromarray(crop))
+
+
+# Function to fill a new pack from any source. fetch_tile(z, x, y) returns
+# a PIL image or None for tiles that are unavailable.
+def build_tile_pack(path, tiles, fetch_tile, workers=8):
+    tiles = list(tiles)
+    added = 0
+    with TilePackBuilder(path, capacity=len(tiles)) as builder:
+        with ThreadPoolExecutor(workers) as executor:
+            for tile, img in zip(tiles, executor.map(lambda t: fetch_tile(*t), tiles)):
+                if img is not None:
+                    builder.add(*tile, img)
+                    added += 1
+
+    return added
+
+
+# Tile source: Mapbox satellite raster tiles. A tile that cannot be fetched
+# is skipped, but CircuitOpen propagates: while the provider is down a bulk
+# job stops instead of skipping every remaining tile.
+def fetch_mapbox_tile(z, x, y):
+    try:
+        data = imagery_client.tile(z, x, y)
+    except CircuitOpen:
+        raise
+    except ImageryUnavailable as e:
+        print(f"Failed to retrieve tile {z}/{x}/{y}: {e}")
+        return None
+
+    return Image.open(BytesIO(data))
+
+
+# Tile source: a local z/x/y.png (or .jpg) directory tree
+def directory_tile_source(root):
+    def fetch_tile(z, x, y):
+        for extension in (".png", ".jpg", ".jpeg"):
+            path = os.path.join(root, str(z), str(x), f"{y}{extension}")
+            if os.path.exists(path):
+                with Image.open(path) as img:
+                    img.load()
+                    return img
+        return None
+
+    return fetch_tile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an offline satellite tile pack")
+    parser.add_argument("output", help="Path of the pack to write (.npy)")
+    parser.add_argument(
+        "--bbox",
+        nargs=4,
+        type=float,
+        required=True,
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+    )
+    parser.add_argument("--zoom", type=int, default=15)
+    parser.add_argument(
+        "--source",
+        default="mapbox",
+        help="'mapbox' or a local z/x/y tile directory",
+    )
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.source == "mapbox":
+        fetch_tile = fetch_mapbox_tile
+    else:
+        fetch_tile = directory_tile_source(args.source)
+
+    tiles = tiles_in_bbox(*args.bbox, args.zoom)
+    try:
+        added = build_tile_pack(args.output, tiles, fetch_tile, workers=args.workers)
+    except CircuitOpen as e:
+        parser.exit(1, f"Stopped, the imagery provider is unavailable: {e}\n")
+    print(f"Wrote {added} tiles to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Serving wrapper for sklearn weather models
+Lives in its own module so pickled models can be loaded by the web app
+"""
+
+
+class ProbabilityModel:
+    """Exposes predict() returning P(fire) with the (n, 1) shape of the Keras model"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        # Return probability of fire (class 1)
+        return self.model.predict_proba(X)[:, 1:2]